@@ -30,7 +30,8 @@
 """
 This module provides an "Upsert" statement for SQL Alchemy which uses
 ON DUPLICATE KEY UPDATE to implement the insert or update semantics. It
-supports doing a bulk insert.
+supports doing a bulk insert. On SQLite, used as a local stand-in, it
+compiles to ON CONFLICT ... DO UPDATE on the upsert key of the table.
 """
 from abc import ABC
 
@@ -43,12 +44,21 @@ class Upsert(expr.Insert):
     pass
 
 
+def upsert_key(table):
+    """Names of the columns identifying a row: `table.info['upsert_key']` if
+    given, otherwise the primary key."""
+    return table.info.get('upsert_key') or table.primary_key.columns.keys()
+
+
+def _parameter_keys(insert_stmt):
+    if insert_stmt._has_multi_parameters:
+        return list(insert_stmt.parameters[0].keys())
+    return list(insert_stmt.parameters.keys())
+
+
 @compiles(Upsert, "mysql")
 def compile_upsert(insert_stmt, compiler, **kwargs):
-    if insert_stmt._has_multi_parameters:
-        keys = insert_stmt.parameters[0].keys()
-    else:
-        keys = insert_stmt.parameters.keys()
+    keys = _parameter_keys(insert_stmt)
     pk = insert_stmt.table.primary_key
     auto = None
     if (len(pk.columns) == 1 and
@@ -72,3 +82,19 @@ def compile_upsert(insert_stmt, compiler, **kwargs):
             updates = last_id
     upsert = ' '.join((insert, ondup, updates))
     return upsert
+
+
+@compiles(Upsert, "sqlite")
+def compile_upsert_sqlite(insert_stmt, compiler, **kwargs):
+    keys = _parameter_keys(insert_stmt)
+    conflict = upsert_key(insert_stmt.table)
+    insert = compiler.visit_insert(insert_stmt, **kwargs)
+    updates = ', '.join(
+        '%s = excluded.%s' % (c.name, c.name)
+        for c in insert_stmt.table.columns
+        if c.name in keys and c.name not in conflict
+    )
+    ondup = 'ON CONFLICT (%s) DO' % ', '.join(conflict)
+    if updates:
+        return ' '.join((insert, ondup, 'UPDATE SET', updates))
+    return ' '.join((insert, ondup, 'NOTHING'))
@@ -76,9 +76,10 @@ def pandas_df_to_mysql(connection, df):
 
 def mysql_to_pandas_df(connection, query):
     try:
-        pd.read_sql(sql=query, con=connection)
+        result = pd.read_sql(sql=query, con=connection)
         connection.commit()
         print("Query executed successfully")
+        return result
     except Error as e:
         print(f"The error '{e}' occurred")
 
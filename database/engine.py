@@ -0,0 +1,61 @@
+"""Process-wide pooled SQLAlchemy engine.
+Every module gets its connections from the engine returned by `get_engine`,
+configured from the environment:
+
+    NEWS_DATABASE_URL     database url (default: the local MySQL news database,
+                          e.g. sqlite:///news.db for a local stand-in)
+    NEWS_DB_POOL_SIZE     connections kept open in the pool
+    NEWS_DB_MAX_OVERFLOW  extra connections allowed under load
+    NEWS_DB_POOL_TIMEOUT  seconds to wait for a free connection
+    NEWS_DB_POOL_RECYCLE  seconds after which a connection is replaced
+
+Connections are pinged before use, so stale connections dropped by the server
+are replaced transparently.
+"""
+import os
+import threading
+import sqlalchemy
+
+DATABASE_URL = os.environ.get('NEWS_DATABASE_URL', 'mysql://root:Ju5Ky1M@@localhost/news')
+POOL_SIZE = int(os.environ.get('NEWS_DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.environ.get('NEWS_DB_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = int(os.environ.get('NEWS_DB_POOL_TIMEOUT', 30))
+POOL_RECYCLE = int(os.environ.get('NEWS_DB_POOL_RECYCLE', 3600))
+
+_engine = None
+_lock = threading.Lock()
+
+
+def get_engine():
+    """Returns the engine of the process, creating it on first use."""
+    global _engine
+    with _lock:
+        if _engine is None:
+            kwargs = {'pool_pre_ping': True}
+            if not DATABASE_URL.startswith('sqlite'):
+                kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                              pool_timeout=POOL_TIMEOUT, pool_recycle=POOL_RECYCLE)
+            _engine = sqlalchemy.create_engine(DATABASE_URL, **kwargs)
+        return _engine
+
+
+def dispose_engine():
+    """Closes every pooled connection, e.g. in a child process after a fork."""
+    global _engine
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def pool_status():
+    """Returns the metrics of the connection pool."""
+    pool = get_engine().pool
+    if not isinstance(pool, sqlalchemy.pool.QueuePool):
+        return {'pool': type(pool).__name__, 'status': pool.status()}
+    return {'pool': type(pool).__name__,
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'status': pool.status()}
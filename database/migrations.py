@@ -0,0 +1,154 @@
+"""Versioned migrations of the news database.
+The version of the schema is kept in the schema_version table. `migrate`
+applies every migration of `MIGRATIONS` above that version, in order, each in
+its own transaction, so it is safe to call on every start. MySQL commits
+every CREATE, RENAME and DROP implicitly, so a migration that fails there
+leaves its earlier statements applied: the migrations resume from the state
+they find instead of assuming they start from scratch.
+"""
+import sqlalchemy
+from database.Upsert import Upsert
+from database import schema
+
+COPY_BATCH_SIZE = 1000
+
+version_metadata = sqlalchemy.MetaData()
+
+schema_version = sqlalchemy.Table('schema_version', version_metadata,
+                                  sqlalchemy.Column('version', sqlalchemy.Integer(), primary_key=True, autoincrement=False),
+                                  sqlalchemy.Column('applied_at', sqlalchemy.DateTime(), nullable=False,
+                                                    server_default=sqlalchemy.func.now())
+                                  )
+
+query_legacy_batch = """
+SELECT title, article_text, url, country, newspaper, city, publication_date
+FROM collection_legacy WHERE title > :last ORDER BY title LIMIT :limit
+"""
+
+
+def _normalize_collection(connection):
+    """Creates the normalized schema. An existing collection table keyed on
+    the title is renamed, copied over in batches in the order of the titles
+    and dropped. If a renamed table is left by an interrupted run, the copy
+    resumes after the last title copied."""
+    inspector = sqlalchemy.inspect(connection)
+    tables = inspector.get_table_names()
+    resume = 'collection_legacy' in tables
+    legacy = (not resume and 'collection' in tables and
+              'url_hash' not in [column['name'] for column in inspector.get_columns('collection')])
+    if legacy:
+        connection.execute(sqlalchemy.text("ALTER TABLE collection RENAME TO collection_legacy"))
+    schema.metadata.create_all(connection)
+    if not (legacy or resume):
+        return
+    last = ''
+    if resume:
+        # Each batch is a single upsert, so every title up to the last one
+        # copied is in the new table.
+        last = connection.execute(sqlalchemy.text("SELECT MAX(title) FROM collection")).scalar() or ''
+    while True:
+        rows = connection.execute(sqlalchemy.text(query_legacy_batch).columns(publication_date=sqlalchemy.Date()),
+                                  last=last, limit=COPY_BATCH_SIZE).fetchall()
+        if not rows:
+            break
+        articles = [dict(row) for row in rows]
+        connection.execute(Upsert(schema.collection, schema.normalize_articles(articles, connection)))
+        last = articles[-1]['title']
+    connection.execute(sqlalchemy.text("DROP TABLE collection_legacy"))
+
+
+query_sqlite_fts = [
+    """CREATE VIRTUAL TABLE collection_fts USING fts5(
+        title, article_text, content='collection', content_rowid='id')""",
+    """CREATE TRIGGER collection_fts_insert AFTER INSERT ON collection BEGIN
+        INSERT INTO collection_fts (rowid, title, article_text) VALUES (new.id, new.title, new.article_text);
+    END""",
+    """CREATE TRIGGER collection_fts_delete AFTER DELETE ON collection BEGIN
+        INSERT INTO collection_fts (collection_fts, rowid, title, article_text)
+        VALUES ('delete', old.id, old.title, old.article_text);
+    END""",
+    """CREATE TRIGGER collection_fts_update AFTER UPDATE ON collection BEGIN
+        INSERT INTO collection_fts (collection_fts, rowid, title, article_text)
+        VALUES ('delete', old.id, old.title, old.article_text);
+        INSERT INTO collection_fts (rowid, title, article_text) VALUES (new.id, new.title, new.article_text);
+    END""",
+    "INSERT INTO collection_fts (collection_fts) VALUES ('rebuild')",
+]
+
+
+def _sqlite_has_fts5(connection):
+    return any(row[0] == 'ENABLE_FTS5' for row in connection.execute(sqlalchemy.text("PRAGMA compile_options")))
+
+
+def _add_fulltext_index(connection):
+    """Indexes the title and text of the articles for keyword search: a
+    FULLTEXT index on MySQL, an FTS5 table kept in sync by triggers on
+    SQLite. Other databases, and SQLite builds without FTS5, are left to the
+    BM25 index of `database.search`."""
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        connection.execute(sqlalchemy.text(
+            "CREATE FULLTEXT INDEX ft_collection_text ON collection (title, article_text)"))
+    elif dialect == 'sqlite' and _sqlite_has_fts5(connection):
+        for query in query_sqlite_fts:
+            connection.execute(sqlalchemy.text(query))
+
+
+query_copy_legacy_tokens = """
+INSERT INTO article_tokens (article_id, title_tokens, text_tokens, pipeline_version)
+SELECT c.id, t.title_tokens, t.text_tokens, t.pipeline_version
+FROM collection c JOIN article_tokens_legacy t ON t.title = c.title
+WHERE c.title IN (SELECT title FROM collection GROUP BY title HAVING COUNT(*) = 1)
+  AND NOT EXISTS (SELECT 1 FROM article_tokens n WHERE n.article_id = c.id)
+"""
+
+
+def _key_tokens_on_article_id(connection):
+    """Keys article_tokens on the id of the article instead of its title,
+    which is not unique. The tokens of the titles shared by several articles
+    are not copied; readers recompute them as missing, or copy them from the
+    collection for the cleaned newspapers (see `database.token_store`). Resumable: a legacy
+    table left by an interrupted run is copied again."""
+    tables = sqlalchemy.inspect(connection).get_table_names()
+    if 'article_tokens' in tables and 'title' in [column['name'] for column in
+                                                  sqlalchemy.inspect(connection).get_columns('article_tokens')]:
+        connection.execute(sqlalchemy.text("ALTER TABLE article_tokens RENAME TO article_tokens_legacy"))
+        tables.append('article_tokens_legacy')
+    schema.article_tokens.create(connection, checkfirst=True)
+    if 'article_tokens_legacy' in tables:
+        connection.execute(sqlalchemy.text(query_copy_legacy_tokens))
+        connection.execute(sqlalchemy.text("DROP TABLE article_tokens_legacy"))
+
+
+MIGRATIONS = [
+    (1, _normalize_collection),
+    (2, _add_fulltext_index),
+    (3, _key_tokens_on_article_id),
+]
+
+
+def current_version(connection):
+    version = connection.execute(sqlalchemy.select([sqlalchemy.func.max(schema_version.c.version)])).scalar()
+    return version or 0
+
+
+def migrate(engine):
+    """Brings the database of `engine` to the latest version. Returns the
+    versions that were applied."""
+    version_metadata.create_all(engine)
+    applied = []
+    with engine.connect() as connection:
+        for version, migration in MIGRATIONS:
+            if version <= current_version(connection):
+                continue
+            with connection.begin():
+                migration(connection)
+                connection.execute(schema_version.insert(), version=version)
+            print("Applied migration {}".format(version))
+            applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    from database.engine import get_engine
+    migrate(get_engine())
@@ -0,0 +1,86 @@
+"""Queries served to the dashboards.
+The number of articles per city is kept in the city_counts rollup table,
+refreshed at ingest for the cities of every stored batch, so the dashboard
+gets all counts in one round trip. The city_versions table holds a data
+version stamp per city, changed whenever ingest commits articles of the
+city, which the dashboards use to tell whether cached results are stale.
+"""
+import time
+import pandas as pd
+import sqlalchemy
+from database.Upsert import Upsert
+
+metadata = sqlalchemy.MetaData()
+
+city_counts = sqlalchemy.Table('city_counts', metadata,
+                               sqlalchemy.Column('city', sqlalchemy.String(64), nullable=False, primary_key=True),
+                               sqlalchemy.Column('article_count', sqlalchemy.Integer(), nullable=False)
+                               )
+
+city_versions = sqlalchemy.Table('city_versions', metadata,
+                                 sqlalchemy.Column('city', sqlalchemy.String(64), nullable=False, primary_key=True),
+                                 sqlalchemy.Column('data_version', sqlalchemy.BigInteger(), nullable=False)
+                                 )
+
+query_refresh_city_counts = """
+REPLACE INTO city_counts (city, article_count)
+SELECT ci.name, COUNT(*) FROM collection c JOIN cities ci ON ci.id = c.city_id
+{} GROUP BY ci.name
+"""
+
+query_country_data_version = """
+SELECT MAX(v.data_version) FROM city_versions v
+WHERE v.city IN (SELECT ci.name FROM collection c
+                 JOIN cities ci ON ci.id = c.city_id
+                 JOIN countries co ON co.id = c.country_id
+                 WHERE co.name = :country)
+"""
+
+
+def create_rollup_table(engine):
+    metadata.create_all(engine)
+
+
+def refresh_city_counts(connection, cities=None):
+    """Recomputes the rollup rows of `cities` (default: every city) with a
+    single GROUP BY query."""
+    if cities is None:
+        connection.execute(sqlalchemy.text(query_refresh_city_counts.format('')))
+        return
+    cities = [city for city in cities if city is not None]
+    if not cities:
+        return
+    query = sqlalchemy.text(query_refresh_city_counts.format('WHERE ci.name IN :cities')).bindparams(
+        sqlalchemy.bindparam('cities', expanding=True))
+    connection.execute(query, cities=cities)
+
+
+def get_city_counts(connection):
+    """Returns a dataframe with the 'city' and 'count' of every city."""
+    result = connection.execute(sqlalchemy.select([city_counts.c.city, city_counts.c.article_count])
+                                .order_by(city_counts.c.city))
+    return pd.DataFrame(result.fetchall(), columns=['city', 'count'])
+
+
+def get_city_names(connection):
+    return list(get_city_counts(connection)['city'])
+
+
+def bump_data_versions(connection, cities):
+    """Gives `cities` a new data version stamp."""
+    stamp = time.time_ns()
+    rows = [{'city': city, 'data_version': stamp} for city in set(cities) if city is not None]
+    if rows:
+        connection.execute(Upsert(city_versions, rows))
+
+
+def get_data_version(connection, city=None, country=None):
+    """Returns the data version stamp of `city`, of the cities of `country`,
+    or of the whole collection if neither is given, 0 if nothing was
+    ingested yet."""
+    if country is not None:
+        return connection.execute(sqlalchemy.text(query_country_data_version), country=country).scalar() or 0
+    query = sqlalchemy.select([sqlalchemy.func.max(city_versions.c.data_version)])
+    if city is not None:
+        query = query.where(city_versions.c.city == city)
+    return connection.execute(query).scalar() or 0
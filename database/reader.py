@@ -0,0 +1,139 @@
+"""Chunked, typed reading of the stored articles.
+`read_articles` yields dataframes of at most `chunksize` articles, paged on
+the article id so memory stays bounded whatever the size of the archive. Only
+the requested columns are selected, and the filters on the publication date,
+country and city are applied by the database. City, country and newspaper
+are categoricals over the full lookup tables, so chunks concatenate without
+losing their dtype.
+
+With `snapshot=True` the result is first written to a Parquet file under
+`SNAPSHOTS` and then streamed from it; later reads with the same arguments
+skip the database until the snapshot is refreshed.
+"""
+import hashlib
+import os
+import pandas as pd
+import sqlalchemy
+from database.schema import collection, cities, countries, newspapers
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+CHUNK_SIZE = 10000
+SNAPSHOTS = os.environ.get('NEWS_SNAPSHOT_DIR', 'SNAPSHOTS')
+
+COLUMNS = {
+    'id': collection.c.id,
+    'title': collection.c.title,
+    'article_text': collection.c.article_text,
+    'url': collection.c.url,
+    'country': countries.c.name,
+    'newspaper': newspapers.c.name,
+    'city': cities.c.name,
+    'publication_date': collection.c.publication_date,
+}
+
+CATEGORICAL_COLUMNS = {'country': countries, 'newspaper': newspapers, 'city': cities}
+
+
+def _categories(connection, columns):
+    return {column: pd.CategoricalDtype(sorted(row[0] for row in connection.execute(
+                sqlalchemy.select([table.c.name])))) for column, table in CATEGORICAL_COLUMNS.items()
+            if column in columns}
+
+
+def _select(columns, start, end, countries_, cities_):
+    query = sqlalchemy.select([COLUMNS[column].label(column) for column in columns]).select_from(
+        collection.join(cities, cities.c.id == collection.c.city_id)
+        .join(countries, countries.c.id == collection.c.country_id)
+        .join(newspapers, newspapers.c.id == collection.c.newspaper_id))
+    if start is not None:
+        query = query.where(collection.c.publication_date >= start)
+    if end is not None:
+        query = query.where(collection.c.publication_date < end)
+    if countries_ is not None:
+        query = query.where(countries.c.name.in_(list(countries_)))
+    if cities_ is not None:
+        query = query.where(cities.c.name.in_(list(cities_)))
+    return query
+
+
+def _read_database(connection, columns, start, end, countries_, cities_, chunksize):
+    selected = columns if 'id' in columns else ['id'] + columns
+    query = _select(selected, start, end, countries_, cities_).order_by(collection.c.id).limit(chunksize)
+    dtypes = _categories(connection, columns)
+    last = None
+    while True:
+        page = query if last is None else query.where(collection.c.id > last)
+        rows = connection.execute(page).fetchall()
+        if not rows:
+            return
+        df = pd.DataFrame([tuple(row) for row in rows], columns=selected)
+        last = int(df['id'].iloc[-1])
+        if 'publication_date' in df:
+            df['publication_date'] = pd.to_datetime(df['publication_date'])
+        df = df[columns].astype(dtypes)
+        yield df
+        if len(rows) < chunksize:
+            return
+
+
+def snapshot_path(columns, start=None, end=None, countries=None, cities=None):
+    """Path of the Parquet snapshot of a `read_articles` call."""
+    key = repr((list(columns), str(start), str(end),
+                sorted(countries) if countries is not None else None,
+                sorted(cities) if cities is not None else None))
+    return os.path.join(SNAPSHOTS, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.parquet')
+
+
+def write_snapshot(chunks, path):
+    """Writes the dataframes of `chunks` to the Parquet file `path`, one row
+    group per chunk."""
+    if pq is None:
+        raise ImportError("pyarrow is required for Parquet snapshots")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    writer = None
+    for df in chunks:
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+        writer.write_table(table.cast(writer.schema))
+    if writer is None:
+        return False
+    writer.close()
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_snapshot(path, columns=None, chunksize=CHUNK_SIZE):
+    """Yields the rows of the Parquet snapshot `path` in dataframes of at
+    most `chunksize` rows."""
+    if pq is None:
+        raise ImportError("pyarrow is required for Parquet snapshots")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_articles(connection, columns=None, start=None, end=None, countries=None, cities=None,
+                  chunksize=CHUNK_SIZE, snapshot=False, refresh=False):
+    """Yields dataframes with the `columns` (default: all of `COLUMNS`) of
+    the articles published in [`start`, `end`) in `countries` and `cities`
+    (default: any), at most `chunksize` rows each.
+    With `snapshot` the chunks are streamed from a local Parquet snapshot,
+    which is written first if it is missing or `refresh` is set."""
+    columns = list(columns or COLUMNS)
+    unknown = [column for column in columns if column not in COLUMNS]
+    if unknown:
+        raise ValueError("unknown columns {}".format(unknown))
+    chunks = _read_database(connection, columns, start, end, countries, cities, chunksize)
+    if not snapshot:
+        return chunks
+    path = snapshot_path(columns, start, end, countries, cities)
+    if refresh or not os.path.exists(path):
+        if not write_snapshot(chunks, path):
+            return iter(())
+    return read_snapshot(path, columns, chunksize)
@@ -0,0 +1,107 @@
+"""Schema of the news database.
+Articles are identified by a surrogate `id` and by the sha1 of their url,
+`url_hash`, on which they are upserted. Their city, country and newspaper are
+stored once in lookup tables and referenced by integer foreign keys, with
+composite indexes on (city_id, publication_date) and
+(country_id, publication_date) for the dashboard filters. The processed
+tokens of an article are stored in article_tokens under its id. The schema is
+created and upgraded by `database.migrations.migrate`.
+"""
+import datetime
+import hashlib
+import sqlalchemy
+from database.Upsert import Upsert
+
+metadata = sqlalchemy.MetaData()
+
+
+def _lookup_table(name, length):
+    return sqlalchemy.Table(name, metadata,
+                            sqlalchemy.Column('id', sqlalchemy.Integer(), primary_key=True, autoincrement=True),
+                            sqlalchemy.Column('name', sqlalchemy.String(length), nullable=False, unique=True),
+                            info={'upsert_key': ['name']}
+                            )
+
+
+cities = _lookup_table('cities', 64)
+countries = _lookup_table('countries', 64)
+newspapers = _lookup_table('newspapers', 128)
+
+collection = sqlalchemy.Table('collection', metadata,
+                              sqlalchemy.Column('id', sqlalchemy.Integer(), primary_key=True, autoincrement=True),
+                              sqlalchemy.Column('url_hash', sqlalchemy.CHAR(40), nullable=False, unique=True),
+                              sqlalchemy.Column('title', sqlalchemy.String(128), nullable=False, index=True),
+                              sqlalchemy.Column('article_text', sqlalchemy.Text(), nullable=False),
+                              sqlalchemy.Column('url', sqlalchemy.Text(), nullable=False),
+                              sqlalchemy.Column('city_id', sqlalchemy.Integer(), sqlalchemy.ForeignKey('cities.id'), nullable=False),
+                              sqlalchemy.Column('country_id', sqlalchemy.Integer(), sqlalchemy.ForeignKey('countries.id'), nullable=False),
+                              sqlalchemy.Column('newspaper_id', sqlalchemy.Integer(), sqlalchemy.ForeignKey('newspapers.id'), nullable=False),
+                              sqlalchemy.Column('publication_date', sqlalchemy.Date(), nullable=False, default=datetime.date(2000, 1, 1)),
+                              sqlalchemy.Index('ix_collection_city_date', 'city_id', 'publication_date'),
+                              sqlalchemy.Index('ix_collection_country_date', 'country_id', 'publication_date'),
+                              info={'upsert_key': ['url_hash']}
+                              )
+
+article_tokens = sqlalchemy.Table('article_tokens', metadata,
+                                  sqlalchemy.Column('article_id', sqlalchemy.Integer(),
+                                                    sqlalchemy.ForeignKey('collection.id', ondelete='CASCADE'),
+                                                    primary_key=True, autoincrement=False),
+                                  sqlalchemy.Column('title_tokens', sqlalchemy.Text(), nullable=False),
+                                  sqlalchemy.Column('text_tokens', sqlalchemy.Text(), nullable=False),
+                                  sqlalchemy.Column('pipeline_version', sqlalchemy.Integer(), nullable=False)
+                                  )
+
+# Columns of an article as returned by the parsers.
+ARTICLE_COLUMNS = ['title', 'article_text', 'url', 'country', 'newspaper', 'city', 'publication_date']
+
+query_articles = """
+SELECT c.id, c.title, c.article_text, c.url, co.name AS country, n.name AS newspaper,
+       ci.name AS city, c.publication_date
+FROM collection c
+JOIN cities ci ON ci.id = c.city_id
+JOIN countries co ON co.id = c.country_id
+JOIN newspapers n ON n.id = c.newspaper_id
+"""
+
+
+def url_hash(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def article_ids(connection, urls, batch_size=500):
+    """Returns the ids of the stored articles of `urls`, in the same order,
+    None for the urls that are not stored."""
+    hashes = [url_hash(url) for url in urls]
+    ids = {}
+    query = sqlalchemy.select([collection.c.url_hash, collection.c.id]).where(
+        collection.c.url_hash.in_(sqlalchemy.bindparam('hashes', expanding=True)))
+    for start in range(0, len(hashes), batch_size):
+        ids.update(connection.execute(query, hashes=hashes[start:start + batch_size]).fetchall())
+    return [ids.get(h) for h in hashes]
+
+
+def lookup_ids(connection, table, names):
+    """Returns a dict from every name of `names` to its id in the lookup
+    `table`, inserting the names that are missing."""
+    names = {name for name in names if name is not None}
+    if not names:
+        return {}
+    connection.execute(Upsert(table, [{'name': name} for name in names]))
+    result = connection.execute(sqlalchemy.select([table.c.name, table.c.id]).where(table.c.name.in_(names)))
+    return dict(result.fetchall())
+
+
+def normalize_articles(articles, connection):
+    """Turns `articles` (dicts with the `ARTICLE_COLUMNS`) into rows of the
+    collection table, resolving their city, country and newspaper ids."""
+    ids = {column: lookup_ids(connection, table, (article[column] for article in articles))
+           for column, table in (('city', cities), ('country', countries), ('newspaper', newspapers))}
+    return [{'url_hash': url_hash(article['url']),
+             'title': article['title'],
+             'article_text': article['article_text'],
+             'url': article['url'],
+             'city_id': ids['city'][article['city']],
+             'country_id': ids['country'][article['country']],
+             'newspaper_id': ids['newspaper'][article['newspaper']],
+             'publication_date': article['publication_date']}
+            for article in articles]
@@ -0,0 +1,165 @@
+"""Keyword search over the stored articles.
+Queries are answered by the full-text index of the database, created by
+migration 2: a FULLTEXT index on MySQL, the collection_fts FTS5 table on
+SQLite. Where there is no such index, an in-process BM25 index is built from
+the stored tokens of the article_tokens table, and rebuilt when the data
+version of the collection changes.
+
+The stored text of the cleaned sources is lemmatized and stripped of its
+stopwords, so every backend is queried with the query passed through the
+same `convert_to_raw_text`.
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from database.news_queries import get_data_version
+from database.schema import query_articles
+from text_processing.text_processing_utils import convert_to_raw_text
+
+SEARCH_LIMIT = 20
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+RESULT_COLUMNS = ['id', 'title', 'url', 'city', 'country', 'newspaper', 'publication_date', 'score']
+
+query_search_mysql = """
+SELECT c.id, c.title, c.url, ci.name AS city, co.name AS country, n.name AS newspaper, c.publication_date,
+       MATCH (c.title, c.article_text) AGAINST (:query IN NATURAL LANGUAGE MODE) AS score
+FROM collection c
+JOIN cities ci ON ci.id = c.city_id
+JOIN countries co ON co.id = c.country_id
+JOIN newspapers n ON n.id = c.newspaper_id
+WHERE MATCH (c.title, c.article_text) AGAINST (:query IN NATURAL LANGUAGE MODE)
+ORDER BY score DESC LIMIT :limit
+"""
+
+query_search_sqlite = """
+SELECT c.id, c.title, c.url, ci.name AS city, co.name AS country, n.name AS newspaper, c.publication_date,
+       -bm25(collection_fts) AS score
+FROM collection_fts
+JOIN collection c ON c.id = collection_fts.rowid
+JOIN cities ci ON ci.id = c.city_id
+JOIN countries co ON co.id = c.country_id
+JOIN newspapers n ON n.id = c.newspaper_id
+WHERE collection_fts MATCH :query
+ORDER BY bm25(collection_fts) LIMIT :limit
+"""
+
+query_stored_tokens = """
+SELECT c.id, t.title_tokens, t.text_tokens
+FROM collection c JOIN article_tokens t ON t.article_id = c.id
+"""
+
+# Data version and BM25 index of the process.
+_bm25 = (None, None)
+_bm25_lock = threading.Lock()
+
+
+class Bm25Index(object):
+    """BM25 index over the stored tokens of the articles."""
+
+    def __init__(self, doc_ids, documents, k1=BM25_K1, b=BM25_B):
+        self.doc_ids = np.asarray(doc_ids)
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(lambda: defaultdict(int))
+        lengths = np.zeros(len(documents))
+        for i, tokens in enumerate(documents):
+            lengths[i] = len(tokens)
+            for token in tokens:
+                postings[token][i] += 1
+        self.norm = k1 * (1 - b + b * lengths / max(lengths.mean() if len(documents) else 0, 1))
+        self.postings = {}
+        for token, counts in postings.items():
+            docs = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            tfs = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            idf = math.log(1 + (len(documents) - len(counts) + 0.5) / (len(counts) + 0.5))
+            self.postings[token] = (docs, tfs, idf)
+
+    @classmethod
+    def from_connection(cls, connection):
+        rows = connection.execute(sqlalchemy.text(query_stored_tokens)).fetchall()
+        return cls([row['id'] for row in rows],
+                   [(row['title_tokens'] + ' ' + row['text_tokens']).split() for row in rows])
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, tokens, limit=SEARCH_LIMIT):
+        """Returns the ids and scores of the `limit` best matches of
+        `tokens`, best first."""
+        scores = np.zeros(len(self.doc_ids))
+        for token in set(tokens):
+            if token not in self.postings:
+                continue
+            docs, tfs, idf = self.postings[token]
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[docs])
+        matches = np.flatnonzero(scores)
+        if len(matches) > limit:
+            matches = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        matches = matches[np.argsort(-scores[matches], kind='stable')]
+        return self.doc_ids[matches].tolist(), scores[matches].tolist()
+
+
+def get_bm25_index(connection, refresh=False):
+    """Returns the BM25 index of the process, built on first use, when the
+    data version of the collection changed since or when `refresh` is
+    set."""
+    global _bm25
+    version = get_data_version(connection)
+    with _bm25_lock:
+        built, index = _bm25
+        if index is None or refresh or built != version:
+            index = Bm25Index.from_connection(connection)
+            _bm25 = (version, index)
+        return index
+
+
+def fulltext_backend(connection):
+    """Name of the full-text index of the database, or None if there is
+    none."""
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        return 'mysql'
+    if dialect == 'sqlite' and 'collection_fts' in sqlalchemy.inspect(connection).get_table_names():
+        return 'fts5'
+    return None
+
+
+def _fts5_query(query):
+    # Quote every word, so that user input is never parsed as FTS5 syntax.
+    return ' OR '.join('"{}"'.format(word) for word in re.findall(r'\w+', query))
+
+
+def _bm25_search(connection, query, limit):
+    ids, scores = get_bm25_index(connection).search(query.split(), limit)
+    if not ids:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    rows = connection.execute(sqlalchemy.text(query_articles + " WHERE c.id IN :ids").bindparams(
+        sqlalchemy.bindparam('ids', expanding=True)), ids=ids).fetchall()
+    by_id = {row['id']: row for row in rows}
+    return pd.DataFrame([[by_id[i][column] for column in RESULT_COLUMNS[:-1]] + [score]
+                         for i, score in zip(ids, scores) if i in by_id], columns=RESULT_COLUMNS)
+
+
+def search_articles(connection, query, limit=SEARCH_LIMIT):
+    """Returns a dataframe with the `RESULT_COLUMNS` of the `limit` articles
+    that best match the keywords of `query`, best first."""
+    query = convert_to_raw_text(query)
+    if not query:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    backend = fulltext_backend(connection)
+    if backend == 'mysql':
+        rows = connection.execute(sqlalchemy.text(query_search_mysql), query=query, limit=limit).fetchall()
+    elif backend == 'fts5':
+        query = _fts5_query(query)
+        if not query:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        rows = connection.execute(sqlalchemy.text(query_search_sqlite), query=query, limit=limit).fetchall()
+    else:
+        return _bm25_search(connection, query, limit)
+    return pd.DataFrame([tuple(row) for row in rows], columns=RESULT_COLUMNS)
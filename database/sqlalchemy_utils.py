@@ -3,7 +3,12 @@ import pandas as pd
 from mysql.connector import Error
 import datetime
 import mysql
-from database.Upsert import Upsert
+from database.Upsert import Upsert, upsert_key
+from database.engine import get_engine
+from database.schema import article_ids, collection as collection_table, normalize_articles
+from database.migrations import migrate
+
+BATCH_SIZE = 500
 
 
 def create_connection(host_name, user_name, user_password, database=None):
@@ -23,37 +28,51 @@ def create_connection(host_name, user_name, user_password, database=None):
 
 
 def create_table():
-    engine = sqlalchemy.create_engine('mysql://root:Ju5Ky1M@@localhost/news')
-    connection = engine.connect()
-    metadata = sqlalchemy.MetaData()
-
-    emp = sqlalchemy.Table('collection', metadata,
-                           sqlalchemy.Column('title', sqlalchemy.String(128), nullable=False, primary_key=True),
-                           sqlalchemy.Column('article_text', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('url', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('country', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('newspaper', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('city', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('publication_date', sqlalchemy.Date(), nullable=False, default=datetime.date(2000, 1, 1))
-                           )
-
-    metadata.create_all(engine)
+    """Returns the engine after bringing its schema to the latest version."""
+    engine = get_engine()
+    migrate(engine)
     return engine
 
 
-def insert_data(collection, connection):
-    metadata = sqlalchemy.MetaData()
-    emp = sqlalchemy.Table('collection', metadata,
-                           sqlalchemy.Column('title', sqlalchemy.String(128), nullable=False, primary_key=True),
-                           sqlalchemy.Column('article_text', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('url', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('country', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('newspaper', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('city', sqlalchemy.Text(), nullable=False),
-                           sqlalchemy.Column('publication_date', sqlalchemy.Date(), nullable=False, default=datetime.date(2000, 1, 1))
-                           )
-    query = Upsert(emp, collection)
-    connection.execute(query)
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_upsert(rows, connection, table=None, batch_size=BATCH_SIZE, prepare=None):
+    """Upserts `rows` (an iterable of dicts) into `table` (default: the
+    collection table) in batches of `batch_size`, each in its own
+    transaction, with the ON DUPLICATE KEY UPDATE semantics of `Upsert`.
+    `prepare`, if given, turns each batch into table rows inside its
+    transaction. The table must have a single-column upsert key. Returns one
+    dict per batch with the number of rows inserted and updated."""
+    table = collection_table if table is None else table
+    key = table.c[upsert_key(table)[0]]
+    stats = []
+    for i, batch in enumerate(_batches(rows, batch_size)):
+        with connection.begin():
+            if prepare is not None:
+                batch = prepare(batch, connection)
+            values = list({row[key.name] for row in batch})
+            existing = len(connection.execute(sqlalchemy.select([key]).where(key.in_(values))).fetchall())
+            connection.execute(Upsert(table, batch))
+        inserted = len(values) - existing
+        stats.append({'batch': i, 'rows': len(batch), 'inserted': inserted, 'updated': len(batch) - inserted})
+    return stats
+
+
+def insert_data(collection, connection, batch_size=BATCH_SIZE):
+    """Upserts the articles of `collection`, as returned by the parsers, on
+    the hash of their url. Returns their ids, in the same order."""
+    collection = list(collection)
+    bulk_upsert(collection, connection, collection_table, batch_size, normalize_articles)
+    return article_ids(connection, [article['url'] for article in collection], batch_size)
 
 
 def create_database(connection, query):
@@ -82,16 +101,20 @@ def pandas_df_to_mysql(connection, df, table_name):
         print(f"The error '{e}' occurred")
 
 
-def mysql_to_pandas_df(connection, query):
+def mysql_to_pandas_df(connection, query, chunksize=None):
+    """Returns the result of `query` as a dataframe, or as an iterator of
+    dataframes of `chunksize` rows. Use `database.reader.read_articles` to
+    read the articles."""
     try:
-        pd.read_sql(sql=query,
-                    con=connection,
-                    index_col=None,
-                    coerce_float=True,
-                    params=None,
-                    parse_dates=None,
-                    chunksize=None)
+        result = pd.read_sql(sql=query,
+                             con=connection,
+                             index_col=None,
+                             coerce_float=True,
+                             params=None,
+                             parse_dates=None,
+                             chunksize=chunksize)
         print("Query executed successfully")
+        return result
     except Error as e:
         print(f"The error '{e}' occurred")
 
@@ -0,0 +1,44 @@
+"""Tests of the process-wide engine with a SQLite stand-in database."""
+import pytest
+import sqlalchemy
+
+from database import engine
+from database.sqlalchemy_utils import create_table
+
+
+@pytest.fixture
+def sqlite_url(tmp_path, monkeypatch):
+    url = 'sqlite:///{}'.format(tmp_path / 'news.db')
+    monkeypatch.setattr(engine, 'DATABASE_URL', url)
+    engine.dispose_engine()
+    yield url
+    engine.dispose_engine()
+
+
+def test_engine_is_shared(sqlite_url):
+    first = engine.get_engine()
+    assert first is engine.get_engine()
+    assert first.dialect.name == 'sqlite'
+    assert str(first.url) == sqlite_url
+
+
+def test_dispose_creates_a_new_engine(sqlite_url):
+    first = engine.get_engine()
+    engine.dispose_engine()
+    assert engine.get_engine() is not first
+
+
+def test_create_table_migrates_the_stand_in(sqlite_url):
+    assert create_table() is engine.get_engine()
+    tables = sqlalchemy.inspect(engine.get_engine()).get_table_names()
+    assert {'collection', 'cities', 'countries', 'newspapers', 'article_tokens', 'schema_version'} <= set(tables)
+    # Migrating again is a no-op.
+    assert create_table() is engine.get_engine()
+
+
+def test_pool_status(sqlite_url):
+    with engine.get_engine().connect() as connection:
+        connection.execute(sqlalchemy.text('SELECT 1'))
+        status = engine.pool_status()
+    assert status['pool'] == type(engine.get_engine().pool).__name__
+    assert isinstance(status['status'], str)
@@ -0,0 +1,109 @@
+"""Tests of the migrations of a legacy database on the SQLite stand-in."""
+import datetime
+
+import pytest
+import sqlalchemy
+
+from database import engine, migrations, schema
+from database.sqlalchemy_utils import insert_data
+
+TITLES = ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo']
+
+
+@pytest.fixture
+def news_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'DATABASE_URL', 'sqlite:///{}'.format(tmp_path / 'news.db'))
+    engine.dispose_engine()
+    yield engine.get_engine()
+    engine.dispose_engine()
+
+
+def article(title):
+    return {'title': title, 'article_text': 'text of ' + title, 'url': 'http://news/' + title,
+            'country': 'SD', 'newspaper': 'Sudan Times', 'city': 'Juba',
+            'publication_date': datetime.date(2021, 1, 1)}
+
+
+def create_legacy_tables(connection, table='collection'):
+    """Creates the title-keyed tables of the first schema and fills them."""
+    connection.execute(sqlalchemy.text(
+        "CREATE TABLE {} (title VARCHAR(128) PRIMARY KEY, article_text TEXT, url TEXT, country TEXT, "
+        "newspaper TEXT, city TEXT, publication_date DATE)".format(table)))
+    connection.execute(sqlalchemy.text(
+        "CREATE TABLE article_tokens (title VARCHAR(128) PRIMARY KEY, title_tokens TEXT, text_tokens TEXT, "
+        "pipeline_version INTEGER)"))
+    for title in TITLES:
+        connection.execute(sqlalchemy.text(
+            "INSERT INTO {} VALUES (:title, :article_text, :url, :country, :newspaper, :city, '2021-01-01')"
+            .format(table)), **article(title))
+        connection.execute(sqlalchemy.text("INSERT INTO article_tokens VALUES (:title, :tokens, :tokens, 1)"),
+                           title=title, tokens=title.lower())
+
+
+def stored_articles(connection):
+    return connection.execute(sqlalchemy.text("""
+        SELECT c.id, c.title, c.url_hash, c.url, ci.name AS city, co.name AS country, n.name AS newspaper,
+               t.title_tokens
+        FROM collection c
+        JOIN cities ci ON ci.id = c.city_id
+        JOIN countries co ON co.id = c.country_id
+        JOIN newspapers n ON n.id = c.newspaper_id
+        LEFT JOIN article_tokens t ON t.article_id = c.id
+        ORDER BY c.title, c.id""")).fetchall()
+
+
+def table_names(news_engine):
+    return set(sqlalchemy.inspect(news_engine).get_table_names())
+
+
+def test_legacy_database_is_normalized(news_engine):
+    with news_engine.connect() as connection:
+        create_legacy_tables(connection)
+    assert migrations.migrate(news_engine) == [1, 2, 3]
+    with news_engine.connect() as connection:
+        rows = stored_articles(connection)
+    assert [row['title'] for row in rows] == TITLES
+    assert all(row['url_hash'] == schema.url_hash(row['url']) for row in rows)
+    assert {(row['city'], row['country'], row['newspaper']) for row in rows} == {('Juba', 'SD', 'Sudan Times')}
+    assert [row['title_tokens'] for row in rows] == [title.lower() for title in TITLES]
+    assert not {'collection_legacy', 'article_tokens_legacy'} & table_names(news_engine)
+    assert migrations.migrate(news_engine) == []
+
+
+def test_tokens_of_shared_titles_are_not_copied(news_engine):
+    migrations.migrate(news_engine)
+    with news_engine.connect() as connection:
+        # A database migrated to version 2 while the tokens were keyed on
+        # the title, which the normalized collection does not keep unique.
+        connection.execute(sqlalchemy.text("DROP TABLE article_tokens"))
+        connection.execute(migrations.schema_version.delete().where(migrations.schema_version.c.version == 3))
+        shared = dict(article('Alpha'), url='http://news/other')
+        ids = insert_data([article('Alpha'), shared, article('Bravo')], connection)
+        connection.execute(sqlalchemy.text(
+            "CREATE TABLE article_tokens (title VARCHAR(128) PRIMARY KEY, title_tokens TEXT, text_tokens TEXT, "
+            "pipeline_version INTEGER)"))
+        connection.execute(sqlalchemy.text("INSERT INTO article_tokens VALUES ('Alpha', 'a', 'a', 1), "
+                                           "('Bravo', 'b', 'b', 1)"))
+    assert migrations.migrate(news_engine) == [3]
+    with news_engine.connect() as connection:
+        tokens = dict(connection.execute(sqlalchemy.text(
+            "SELECT article_id, title_tokens FROM article_tokens")).fetchall())
+    assert tokens == {ids[2]: 'b'}
+
+
+def test_interrupted_normalization_resumes(news_engine, monkeypatch):
+    monkeypatch.setattr(migrations, 'COPY_BATCH_SIZE', 2)
+    with news_engine.connect() as connection:
+        # State left on MySQL by a run interrupted after its first batch:
+        # the renamed legacy table, and the new tables partly filled.
+        create_legacy_tables(connection, 'collection_legacy')
+        schema.metadata.create_all(connection, tables=[table for table in schema.metadata.sorted_tables
+                                                       if table.name != 'article_tokens'])
+        copied = insert_data([article(title) for title in TITLES[:2]], connection)
+    assert migrations.migrate(news_engine) == [1, 2, 3]
+    with news_engine.connect() as connection:
+        rows = stored_articles(connection)
+    assert [row['title'] for row in rows] == TITLES
+    assert [row['id'] for row in rows[:2]] == copied
+    assert [row['title_tokens'] for row in rows] == [title.lower() for title in TITLES]
+    assert 'collection_legacy' not in table_names(news_engine)
@@ -0,0 +1,49 @@
+"""Tests of the stored tokens on the SQLite stand-in database."""
+import datetime
+
+import pytest
+import sqlalchemy
+
+from database import engine, token_store
+from database.schema import article_tokens
+from database.sqlalchemy_utils import create_table, insert_data
+from text_processing.text_processing_utils import PIPELINE_VERSION
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'DATABASE_URL', 'sqlite:///{}'.format(tmp_path / 'news.db'))
+    # Stands in for the lemmatizer, whose NLTK data is not needed here.
+    monkeypatch.setattr(token_store, 'convert_to_raw_text_batch', lambda texts: [text.lower() for text in texts])
+    engine.dispose_engine()
+    connection = create_table().connect()
+    yield connection
+    connection.close()
+    engine.dispose_engine()
+
+
+def article(i, newspaper, country):
+    return {'title': 'Title {}'.format(i), 'article_text': 'Text {}'.format(i), 'url': 'http://news/{}'.format(i),
+            'country': country, 'newspaper': newspaper, 'city': 'Juba',
+            'publication_date': datetime.date(2021, 1, 1)}
+
+
+def stored_versions(connection):
+    query = sqlalchemy.select([article_tokens.c.article_id, article_tokens.c.pipeline_version])
+    return dict(connection.execute(query).fetchall())
+
+
+def test_missing_tokens_are_computed(connection):
+    ids = insert_data([article(0, 'Hiiraan Online', 'SO')], connection)
+    tokens = token_store.load_country_tokens(connection, 'SO')
+    assert tokens.values.tolist() == [['title 0', 'text 0']]
+    assert stored_versions(connection) == {ids[0]: PIPELINE_VERSION}
+
+
+def test_cleaned_newspapers_are_not_cleaned_twice(connection):
+    ids = insert_data([article(0, 'Sudan Times', 'SD'), article(1, 'Sudan Times', 'SD')], connection)
+    connection.execute(article_tokens.insert(), article_id=ids[1], title_tokens='old', text_tokens='old',
+                       pipeline_version=PIPELINE_VERSION - 1)
+    tokens = token_store.load_country_tokens(connection, 'SD')
+    assert tokens.values.tolist() == [['Title 0', 'Text 0'], ['old', 'old']]
+    assert stored_versions(connection) == {ids[0]: token_store.COPIED_VERSION, ids[1]: PIPELINE_VERSION - 1}
@@ -0,0 +1,64 @@
+"""Tests of the batched upserts on the SQLite stand-in database."""
+import datetime
+
+import pytest
+import sqlalchemy
+from sqlalchemy.dialects import sqlite
+
+from database import engine
+from database.Upsert import Upsert
+from database.schema import cities, collection, normalize_articles
+from database.sqlalchemy_utils import bulk_upsert, create_table, insert_data
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'DATABASE_URL', 'sqlite:///{}'.format(tmp_path / 'news.db'))
+    engine.dispose_engine()
+    connection = create_table().connect()
+    yield connection
+    connection.close()
+    engine.dispose_engine()
+
+
+def article(i, text='text'):
+    return {'title': 'title {}'.format(i), 'article_text': text, 'url': 'http://news/{}'.format(i),
+            'country': 'Sudan', 'newspaper': 'Sudan Tribune', 'city': 'Juba',
+            'publication_date': datetime.date(2021, 1, i + 1)}
+
+
+def test_sqlite_upsert_compiles_to_on_conflict():
+    rows = [{'url_hash': 'a', 'title': 't', 'article_text': 'x', 'url': 'u', 'city_id': 1, 'country_id': 1,
+             'newspaper_id': 1, 'publication_date': datetime.date(2021, 1, 1)}]
+    sql = str(Upsert(collection, rows).compile(dialect=sqlite.dialect()))
+    assert 'ON CONFLICT (url_hash) DO UPDATE SET' in sql
+    assert 'title = excluded.title' in sql
+    assert 'url_hash = excluded.url_hash' not in sql
+
+
+def test_sqlite_upsert_of_key_only_does_nothing():
+    sql = str(Upsert(cities, [{'name': 'Juba'}]).compile(dialect=sqlite.dialect()))
+    assert sql.endswith('ON CONFLICT (name) DO NOTHING')
+
+
+def test_bulk_upsert_counts_inserted_and_updated(connection):
+    stats = bulk_upsert([article(i) for i in range(3)], connection, collection, batch_size=2,
+                        prepare=normalize_articles)
+    assert stats == [{'batch': 0, 'rows': 2, 'inserted': 2, 'updated': 0},
+                     {'batch': 1, 'rows': 1, 'inserted': 1, 'updated': 0}]
+    stats = bulk_upsert([article(1, 'new'), article(2, 'new'), article(3)], connection, collection,
+                        batch_size=5, prepare=normalize_articles)
+    assert stats == [{'batch': 0, 'rows': 3, 'inserted': 1, 'updated': 2}]
+    texts = dict(connection.execute(sqlalchemy.select([collection.c.title, collection.c.article_text])).fetchall())
+    assert texts == {'title 0': 'text', 'title 1': 'new', 'title 2': 'new', 'title 3': 'text'}
+
+
+def test_insert_data_returns_ids_in_order(connection):
+    ids = insert_data([article(i) for i in range(3)], connection)
+    assert insert_data([article(2), article(0)], connection) == [ids[2], ids[0]]
+
+
+def test_empty_upsert_is_a_noop(connection):
+    assert bulk_upsert([], connection, collection) == []
+    assert insert_data([], connection) == []
+    assert connection.execute(sqlalchemy.select([sqlalchemy.func.count()]).select_from(collection)).scalar() == 0
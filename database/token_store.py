@@ -0,0 +1,112 @@
+"""Processed tokens of the stored articles.
+The output of `convert_to_raw_text` for every article is stored once at
+ingest in the article_tokens table, with the `PIPELINE_VERSION` that produced
+it, keyed on the id of the article. Readers get the stored tokens and only
+recompute the rows whose version is stale.
+
+The newspapers with `clean` sources store the output of `convert_to_raw_text`
+in the collection table, so their raw text is lost and their tokens cannot
+be recomputed: their stored tokens are kept whatever their version, and the
+missing ones are copied from the collection with `COPIED_VERSION`.
+"""
+import pandas as pd
+import sqlalchemy
+from database.schema import article_tokens
+from database.sqlalchemy_utils import bulk_upsert
+from text_processing.text_processing_utils import PIPELINE_VERSION, convert_to_raw_text_batch
+from webcrawler.sources import SOURCES
+
+CLEANED_NEWSPAPERS = frozenset(source['newspaper'] for source in SOURCES.values() if source['clean'])
+# Pipeline version of the tokens copied from the cleaned collection text,
+# which is unknown.
+COPIED_VERSION = 0
+
+query_tokens = """
+SELECT c.id, c.title, c.article_text, n.name AS newspaper, t.title_tokens, t.text_tokens, t.pipeline_version
+FROM collection c
+JOIN cities ci ON ci.id = c.city_id
+JOIN countries co ON co.id = c.country_id
+JOIN newspapers n ON n.id = c.newspaper_id
+LEFT JOIN article_tokens t ON t.article_id = c.id
+WHERE {}
+"""
+
+
+def create_token_table(engine):
+    # Created with the collection by the migrations; kept for the callers
+    # that set up their tables one by one.
+    article_tokens.create(engine, checkfirst=True)
+
+
+def compute_tokens(collection):
+    """Sets the 'title_tokens' and 'text_tokens' of the articles of
+    `collection` (dicts with 'title' and 'article_text') that have none."""
+    missing = [article for article in collection if 'title_tokens' not in article]
+    if not missing:
+        return
+    tokens = convert_to_raw_text_batch([article['title'] for article in missing] +
+                                       [article['article_text'] for article in missing])
+    for i, article in enumerate(missing):
+        article['title_tokens'], article['text_tokens'] = tokens[i], tokens[len(missing) + i]
+
+
+def store_tokens(collection, ids, connection):
+    """Stores the tokens of the articles of `collection` (dicts with
+    'title' and 'article_text' as in the collection table) under their
+    `ids`, as returned by `insert_data`. The crawler computes them in its
+    clean stage; they are computed here only for the articles without
+    'title_tokens'. Returns the stored rows."""
+    if not collection:
+        return []
+    compute_tokens(collection)
+    rows = [{'article_id': article_id,
+             'title_tokens': article['title_tokens'],
+             'text_tokens': article['text_tokens'],
+             'pipeline_version': PIPELINE_VERSION}
+            for article, article_id in zip(collection, ids) if article_id is not None]
+    bulk_upsert(rows, connection, article_tokens)
+    return rows
+
+
+def copy_tokens(rows, connection):
+    """Stores the cleaned collection text of `rows` (with 'id', 'title'
+    and 'article_text') as their tokens. Returns the stored rows."""
+    rows = [{'article_id': row['id'],
+             'title_tokens': row['title'],
+             'text_tokens': row['article_text'],
+             'pipeline_version': COPIED_VERSION}
+            for row in rows]
+    bulk_upsert(rows, connection, article_tokens)
+    return rows
+
+
+def _load_tokens(connection, where, **params):
+    rows = connection.execute(sqlalchemy.text(query_tokens.format(where)), **params).fetchall()
+    stale, missing = [], []
+    for row in rows:
+        if row['newspaper'] in CLEANED_NEWSPAPERS:
+            if row['pipeline_version'] is None:
+                missing.append(row)
+        elif row['pipeline_version'] != PIPELINE_VERSION:
+            stale.append(row)
+    fresh = store_tokens([{'title': row['title'], 'article_text': row['article_text']} for row in stale],
+                         [row['id'] for row in stale], connection)
+    fresh = {row['article_id']: row for row in fresh + copy_tokens(missing, connection)}
+    tokens = []
+    for row in rows:
+        row = fresh.get(row['id'], row)
+        tokens.append([row['title_tokens'], row['text_tokens']])
+    return pd.DataFrame(tokens, columns=['title', 'article_text'])
+
+
+def load_city_tokens(connection, city):
+    """Returns a dataframe with the stored tokens of the articles of `city`
+    in its 'title' and 'article_text' columns. Rows that are missing or have
+    a stale pipeline version are recomputed and stored first, except for
+    the cleaned newspapers."""
+    return _load_tokens(connection, 'ci.name = :city', city=city)
+
+
+def load_country_tokens(connection, country):
+    """Same as `load_city_tokens` for the articles of `country`."""
+    return _load_tokens(connection, 'co.name = :country', country=country)
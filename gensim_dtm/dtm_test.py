@@ -10,16 +10,14 @@ import numpy as np
 import os
 import pandas as pd
 from collections import defaultdict
-from gensim.corpora.dictionary import Dictionary
 from gensim.models.wrappers import DtmModel
-from gensim.matutils import corpus2csc
 from scipy.spatial.distance import cosine
 from scipy.sparse import save_npz, load_npz
-from scipy.stats import linregress
 
 from src import HOME_DIR
 from src.utils.corpus import Corpus
 from src.utils.wiki2vec import wiki2vec
+from gensim_dtm.streaming_corpus import build_corpus, slice_term_counts
 
 
 class Dtm(DtmModel):
@@ -85,42 +83,52 @@ class Dtm(DtmModel):
         ]
         return sorted(weighted, reverse=True)[:topn]
 
+    @property
+    def terms(self):
+        """Array of the terms of the vocabulary, ordered by id."""
+        if getattr(self, '_terms', None) is None:
+            terms = np.empty(len(self.id2word.token2id), dtype=object)
+            for term, term_id in self.id2word.token2id.items():
+                terms[term_id] = term
+            self._terms = terms
+        return self._terms
+
+    def topic_probabilities(self, topic):
+        """Probability of each term in each time slice for a given topic, as
+        a terms x time slices array. Computed once per topic."""
+        if getattr(self, '_topic_probabilities', None) is None:
+            self._topic_probabilities = {}
+        if topic not in self._topic_probabilities:
+            p = np.exp(self.lambda_[topic] - self.lambda_[topic].max(axis=0))
+            self._topic_probabilities[topic] = p / p.sum(axis=0)
+        return self._topic_probabilities[topic]
+
     def term_distribution(self, term, topic):
         """Extracts the probability over each time slice of a term/topic
         pair."""
         word_index = self.id2word.token2id[term]
-        topic_slice = np.exp(self.lambda_[topic])
-        topic_slice = topic_slice / topic_slice.sum(axis=0)
-        return topic_slice[word_index]
+        return self.topic_probabilities(topic)[word_index]
 
     def term_variance(self, topic):
         """Finds variance of probability over time for terms for a given topic.
         High variance terms are more likely to be interesting than low variance
         terms."""
-        p = np.exp(self.lambda_[topic]) / \
-            np.exp(self.lambda_[topic]).sum(axis=0)
-        variances = np.var(p, axis=1)
+        variances = np.var(self.topic_probabilities(topic), axis=1)
         order = np.argsort(variances)[::-1]
-        terms = np.array([term for term, _
-                          in sorted(self.id2word.token2id.items(),
-                                    key=lambda x: x[1])])[order]
-        variances = variances[order]
-        return list(zip(terms, variances))
+        return list(zip(self.terms[order], variances[order]))
 
     def term_slope(self, topic):
         """Finds slope of probability over time for terms for a given topic.
         This is useful for roughly identifying terms that are rising or
         declining in popularity over time."""
-        p = np.exp(self.lambda_[topic]) / \
-            np.exp(self.lambda_[topic]).sum(axis=0)
-        slopes = np.apply_along_axis(
-            lambda y: linregress(x=range(len(y)), y=y).slope, axis=1, arr=p)
+        p = self.topic_probabilities(topic)
+        # Least squares slope of every term at once against x = 0, 1, ...
+        # as sum((x - mean(x)) * (y - mean(y))) / sum((x - mean(x)) ** 2),
+        # where the mean of y drops out because the x deviations sum to 0.
+        x = np.arange(p.shape[1]) - (p.shape[1] - 1) / 2
+        slopes = p @ x / (x ** 2).sum()
         order = np.argsort(slopes)
-        terms = np.array([term for term, _
-                          in sorted(self.id2word.token2id.items(),
-                                    key=lambda x: x[1])])[order]
-        slopes = slopes[order]
-        return list(zip(terms, slopes))
+        return list(zip(self.terms[order], slopes[order]))
 
     def plot_terms(self, topic, terms, title=None, name=None, hide_y=True):
         """Creates a plot of term probabilities over time in a given topic."""
@@ -285,22 +293,19 @@ def train(args, output_dir):
     dir."""
     corpus = Corpus()
 
-    # Create the dictionary.
-    dictionary = Dictionary(corpus.debates.bag_of_words)
-    dictionary.filter_extremes(no_below=100)
+    # Create the dictionary and stream the corpus to disk.
+    dtm_corpus, dictionary = build_corpus(
+        corpus.debates.bag_of_words, os.path.join(output_dir, 'corpus'),
+        no_below=100)
 
     # Save empirical term distribution within each time step.
-    term_counts = corpus2csc(
-        corpus.debates.groupby('year')
-            .agg({'bag_of_words': 'sum'})
-            .bag_of_words
-            .apply(dictionary.doc2bow))
+    time_slices = corpus.debates.groupby('year').size()
+    term_counts = slice_term_counts(
+        dtm_corpus, time_slices.values, len(dictionary))
     save_npz(
         os.path.join(output_dir, 'term_counts.npz'), term_counts)
 
     # Train and save dtm.
-    time_slices = corpus.debates.groupby('year').size()
-    dtm_corpus = corpus.debates.bag_of_words.apply(dictionary.doc2bow)
     model = Dtm(
         args.executable, corpus=dtm_corpus, id2word=dictionary,
         num_topics=args.num_topics,
@@ -6,17 +6,18 @@ import gensim
 import nltk
 
 import gensim.corpora as corpora
+import numpy as np
+from gensim import matutils
 import pyLDAvis.gensim
 import pickle
 import pyLDAvis
 from database.sqlalchemy_utils import *
+from gensim_dtm.streaming_corpus import DatabaseTexts, build_corpus, rewrite_corpus
 
-os.chdir('..')
-# Read data into papers
-conn = create_connection('localhost', 'root', 'Ju5Ky1M@', 'news')
-papers = pd.read_sql("SELECT * FROM collection", conn)
-# Print head
-print(papers.head())
+# Words with a lower normalized tf-idf weight in their document are pruned.
+LOW_VALUE = 0.25
+# Weights gensim's TfidfModel treats as zero.
+TFIDF_EPS = 1e-12
 
 
 def sent_to_words(sentences):
@@ -24,7 +25,42 @@ def sent_to_words(sentences):
         yield gensim.utils.simple_preprocess(str(sentence), deacc=True)
 
 
-def perform_lda(news_dataframe, num_topics=5):
+def _row_norms(values, indptr):
+    """L2 norms of the rows of a CSR matrix. The squares of every row are
+    summed from left to right like gensim's `unitvec` does, so the norms are
+    bit for bit the same as those of `TfidfModel`."""
+    lengths = np.diff(indptr)
+    # Rows by decreasing length, so the rows longer than k are a prefix.
+    order = np.argsort(-lengths, kind='stable')
+    longer = np.searchsorted(-lengths[order], -np.arange(lengths.max(initial=0)), side='left')
+    sums = np.zeros(len(lengths))
+    for k, count in enumerate(longer):
+        rows = order[:count]
+        sums[rows] += values[indptr[rows] + k] ** 2
+    return np.sqrt(sums)
+
+
+def prune_low_tfidf(corpus, tfidf, num_terms, low_value=LOW_VALUE):
+    """Removes from every document of `corpus` the words whose normalized
+    tf-idf weight in `tfidf` is below `low_value`, and the words tfidf gives
+    no weight to. Returns the pruned corpus with the original counts."""
+    counts = matutils.corpus2csc(corpus, num_terms=num_terms, num_docs=len(corpus), dtype=np.int64).T.tocsr()
+    idfs = np.zeros(num_terms)
+    idfs[np.fromiter(tfidf.idfs.keys(), dtype=np.int64)] = np.fromiter(tfidf.idfs.values(), dtype=np.float64)
+    idf = idfs[counts.indices]
+    in_tfidf = np.abs(idf) > TFIDF_EPS
+    weights = np.where(in_tfidf, counts.data * idf, 0.0)
+    rows = np.repeat(np.arange(len(corpus)), np.diff(counts.indptr))
+    norms = _row_norms(weights, counts.indptr)[rows]
+    weights = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+    keep = in_tfidf & (np.abs(weights) > TFIDF_EPS) & (weights >= low_value)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows[keep], minlength=len(corpus)))])
+    ids = counts.indices[keep].tolist()
+    values = counts.data[keep].tolist()
+    return [list(zip(ids[start:end], values[start:end])) for start, end in zip(indptr[:-1], indptr[1:])]
+
+
+def perform_lda(news_dataframe, num_topics=5, low_value=LOW_VALUE, alpha='symmetric', eta=None):
     news_dataframe['paper_text_processed'] = news_dataframe['title'] + ' ' + news_dataframe['article_text']
     data = news_dataframe.paper_text_processed.values.tolist()
     data_words = list(sent_to_words(data))
@@ -36,18 +72,25 @@ def perform_lda(news_dataframe, num_topics=5):
     # Term Document Frequency
     corpus = [id2word.doc2bow(text) for text in texts]
     tfidf = gensim.models.TfidfModel(corpus, id2word)
-    low_value = 0.25
-    for i in range(0, len(corpus)):
-        bow = corpus[i]
-        tfidf_ids = [id for id, value in tfidf[bow]]
-        bow_ids = [id for id, value in bow]
-        low_value_words = [id for id, value in tfidf[bow] if value < low_value]
-        words_missing_in_tfidf = [id for id in bow_ids if id not in tfidf_ids]
-        new_bow = [b for b in bow if b[0] not in low_value_words and b[0] not in words_missing_in_tfidf]
-        corpus[i] = new_bow
+    corpus = prune_low_tfidf(corpus, tfidf, len(id2word), low_value)
+    lda_model = gensim.models.LdaMulticore(corpus=corpus, id2word=id2word, num_topics=num_topics,
+                                           alpha=alpha, eta=eta)
+    return lda_model
+
+
+def train_lda(texts, corpus_dir, num_topics=5, low_value=LOW_VALUE):
+    """Like `perform_lda` on a re-iterable of token lists, e.g. a
+    `DatabaseTexts`, larger than memory. The corpus is serialized under
+    `corpus_dir` and streamed from there."""
+    corpus, id2word = build_corpus(texts, corpus_dir)
+    tfidf = gensim.models.TfidfModel(corpus, id2word)
+    corpus = rewrite_corpus(corpus, id2word, corpus_dir,
+                            lambda chunk: prune_low_tfidf(chunk, tfidf, len(id2word), low_value))
     lda_model = gensim.models.LdaMulticore(corpus=corpus, id2word=id2word, num_topics=num_topics)
     return lda_model
 
 
 if __name__ == '__main__':
-    model = perform_lda()
+    os.chdir('..')
+    model = train_lda(DatabaseTexts(), os.path.join('MODELS', 'corpus'))
+    pprint(model.print_topics())
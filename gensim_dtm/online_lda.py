@@ -0,0 +1,257 @@
+"""Incremental topic model of the whole collection.
+A gensim `LdaModel` and its `Dictionary` are persisted under `ONLINE_DIR`,
+together with the id of the last article they have seen. Every refresh folds
+the articles stored since then into the model with online variational Bayes
+updates, so its cost depends on the number of new articles only:
+
+- New words enter the vocabulary when they occur in at least
+  `NEW_TERM_MIN_DF` of the new articles, at most `MAX_NEW_TERMS` per refresh
+  and `MAX_VOCABULARY` in total. Their topic-word parameters start from the
+  prior, like those of a new model. The words filtered out of the
+  vocabulary at the last full training are never added back.
+- The model is retrained from scratch every `RETRAIN_DAYS`, or when the new
+  articles drift away from it: when the perplexity of the model on them
+  exceeds `DRIFT_PERPLEXITY_RATIO` times its perplexity on the first articles
+  folded in after the last full training, or when more than `DRIFT_OOV_RATE` of their words are
+  out of the vocabulary, not counting the words filtered out of it.
+
+Run it daily with
+
+    python -m gensim_dtm.online_lda
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import sqlalchemy
+from gensim.corpora.dictionary import Dictionary
+from gensim.models import LdaModel
+
+from database.engine import get_engine
+from gensim_dtm.topic_builder import MODELS, NUM_TOPICS
+
+ONLINE_DIR = os.path.join(MODELS, 'online')
+CHUNK_SIZE = 2000
+NO_BELOW = 5
+NO_ABOVE = 0.5
+MAX_VOCABULARY = 100000
+NEW_TERM_MIN_DF = 3
+MAX_NEW_TERMS = 2000
+RETRAIN_DAYS = 7
+DRIFT_PERPLEXITY_RATIO = 1.5
+DRIFT_OOV_RATE = 0.2
+PASSES = 2
+
+query_new_tokens = """
+SELECT c.id, t.title_tokens, t.text_tokens
+FROM collection c JOIN article_tokens t ON t.article_id = c.id
+WHERE c.id > :last_id ORDER BY c.id LIMIT :limit
+"""
+
+
+class StoredTokens(object):
+    """Re-iterable stream of the stored tokens of the articles with an id
+    above `last_id`, read in chunks of `chunk_size` articles."""
+
+    def __init__(self, engine, last_id=0, chunk_size=CHUNK_SIZE):
+        self.engine = engine
+        self.last_id = last_id
+        self.chunk_size = chunk_size
+        self.max_id = last_id
+
+    def __iter__(self):
+        last_id = self.last_id
+        with self.engine.connect() as connection:
+            while True:
+                rows = connection.execute(sqlalchemy.text(query_new_tokens),
+                                          last_id=last_id, limit=self.chunk_size).fetchall()
+                for row in rows:
+                    yield (row['title_tokens'] + ' ' + row['text_tokens']).split()
+                if rows:
+                    last_id = rows[-1]['id']
+                if len(rows) < self.chunk_size:
+                    break
+        self.max_id = max(self.max_id, last_id)
+
+
+class BowStream(object):
+    """Re-iterable bag-of-words view of a stream of token lists."""
+
+    def __init__(self, documents, dictionary):
+        self.documents = documents
+        self.dictionary = dictionary
+
+    def __iter__(self):
+        for tokens in self.documents:
+            yield self.dictionary.doc2bow(tokens)
+
+
+def _paths(directory):
+    return (os.path.join(directory, 'lda.model'), os.path.join(directory, 'dictionary.dict'),
+            os.path.join(directory, 'state.json'))
+
+
+def load(directory=ONLINE_DIR):
+    """Returns the persisted model, dictionary and state, or Nones if there
+    is no model yet."""
+    model_path, dictionary_path, state_path = _paths(directory)
+    if not os.path.exists(state_path):
+        return None, None, None
+    with open(state_path) as infile:
+        state = json.load(infile)
+    return LdaModel.load(model_path), Dictionary.load(dictionary_path), state
+
+
+def save(model, dictionary, state, directory=ONLINE_DIR):
+    """Persists the model, dictionary and state. The state is written last,
+    so an interrupted save is picked up as the previous model."""
+    os.makedirs(directory, exist_ok=True)
+    model_path, dictionary_path, state_path = _paths(directory)
+    model.save(model_path)
+    dictionary.save(dictionary_path)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as outfile:
+        json.dump(state, outfile)
+    os.replace(tmp_path, state_path)
+
+
+def perplexity(model, bows):
+    bows = [bow for bow in bows if bow]
+    if not bows:
+        return None
+    return float(np.exp2(-model.log_perplexity(bows)))
+
+
+def grow_vocabulary(model, dictionary, documents, removed=(), min_df=NEW_TERM_MIN_DF,
+                    max_new_terms=MAX_NEW_TERMS, max_vocabulary=MAX_VOCABULARY):
+    """Adds to `dictionary` and `model` the unknown words of `documents`
+    found in at least `min_df` of them, the most frequent first, within the
+    limits on the number of new and total terms. The `removed` words are
+    left out. Returns the new words."""
+    dfs = {}
+    for tokens in documents:
+        for token in set(tokens):
+            if token not in dictionary.token2id and token not in removed:
+                dfs[token] = dfs.get(token, 0) + 1
+    room = min(max_new_terms, max_vocabulary - len(dictionary))
+    new_terms = sorted((token for token, df in dfs.items() if df >= min_df), key=lambda t: (-dfs[t], t))
+    new_terms = new_terms[:max(room, 0)]
+    if not new_terms:
+        return []
+    for token in new_terms:
+        term_id = len(dictionary.token2id)
+        dictionary.token2id[token] = term_id
+        dictionary.dfs[term_id] = dfs[token]
+    dictionary.id2token = {}
+    # Same initialization as the topic-word statistics of a new LdaModel.
+    num_new = len(new_terms)
+    sstats = model.random_state.gamma(100., 1. / 100., (model.num_topics, num_new)).astype(model.dtype)
+    model.state.sstats = np.hstack([model.state.sstats, sstats])
+    if model.eta.ndim == 1:
+        model.eta = np.concatenate([model.eta, np.full(num_new, model.eta.mean(), dtype=model.dtype)])
+    else:
+        model.eta = np.hstack([model.eta, np.repeat(model.eta.mean(axis=1, keepdims=True), num_new, axis=1)])
+    model.state.eta = model.eta
+    model.num_terms = len(dictionary)
+    model.id2word = dictionary
+    model.sync_state()
+    return new_terms
+
+
+def build_dictionary(documents):
+    """Returns the dictionary of `documents` without its too rare and too
+    frequent words, and the sorted list of the words filtered out."""
+    dictionary = Dictionary(documents)
+    vocabulary = set(dictionary.token2id)
+    dictionary.filter_extremes(no_below=NO_BELOW, no_above=NO_ABOVE, keep_n=MAX_VOCABULARY)
+    return dictionary, sorted(vocabulary.difference(dictionary.token2id))
+
+
+def train_full(engine, num_topics=NUM_TOPICS):
+    """Trains a model from scratch on every stored article. Returns the
+    model, its dictionary and its state."""
+    documents = StoredTokens(engine)
+    dictionary, removed = build_dictionary(documents)
+    corpus = BowStream(documents, dictionary)
+    model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, chunksize=CHUNK_SIZE,
+                     passes=PASSES, update_every=1)
+    state = {'last_id': documents.max_id,
+             'num_documents': dictionary.num_docs,
+             'last_full_train': time.time(),
+             # Measured on the first unseen articles, not on the training set.
+             'baseline_perplexity': None,
+             'updates': 0,
+             'removed_tokens': removed}
+    return model, dictionary, state
+
+
+def drift(model, dictionary, documents, state):
+    """Returns the reason why `documents` drifted away from the model, or
+    None, and the perplexity of the model on them. The words filtered out
+    at the last full training are not out of the vocabulary."""
+    removed = set(state.get('removed_tokens', ()))
+    tokens = sum(len(document) for document in documents)
+    oov = sum(token not in dictionary.token2id and token not in removed
+              for document in documents for token in document)
+    if tokens and oov / tokens > DRIFT_OOV_RATE:
+        return 'out of vocabulary rate {:.2f}'.format(oov / tokens), None
+    current = perplexity(model, [dictionary.doc2bow(document) for document in documents])
+    baseline = state.get('baseline_perplexity')
+    if current is not None and baseline and current > DRIFT_PERPLEXITY_RATIO * baseline:
+        return 'perplexity {:.1f} against {:.1f}'.format(current, baseline), current
+    return None, current
+
+
+def refresh(engine=None, directory=ONLINE_DIR, num_topics=NUM_TOPICS, force_retrain=False):
+    """Folds the articles stored since the last refresh into the model, or
+    retrains it when it is due or has drifted. Returns a summary."""
+    engine = engine or get_engine()
+    model, dictionary, state = load(directory)
+    reason = None
+    if force_retrain:
+        reason = 'forced'
+    elif model is None:
+        reason = 'no model'
+    elif time.time() - state['last_full_train'] > RETRAIN_DAYS * 24 * 3600:
+        reason = 'scheduled'
+    new_documents = []
+    if reason is None:
+        stream = StoredTokens(engine, state['last_id'])
+        new_documents = [document for document in stream if document]
+        if not new_documents:
+            return {'action': 'none', 'new_documents': 0}
+        reason, current = drift(model, dictionary, new_documents, state)
+    if reason is not None:
+        model, dictionary, state = train_full(engine, num_topics)
+        save(model, dictionary, state, directory)
+        return {'action': 'retrain', 'reason': reason, 'documents': state['num_documents']}
+    new_terms = grow_vocabulary(model, dictionary, new_documents, set(state.get('removed_tokens', ())))
+    model.update([dictionary.doc2bow(document) for document in new_documents], chunksize=CHUNK_SIZE)
+    if state['baseline_perplexity'] is None:
+        state['baseline_perplexity'] = current
+    state['last_id'] = stream.max_id
+    state['num_documents'] += len(new_documents)
+    state['updates'] += 1
+    save(model, dictionary, state, directory)
+    return {'action': 'update', 'new_documents': len(new_documents), 'new_terms': len(new_terms)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-r', '--retrain',
+        help='Retrain the model from scratch.',
+        action='store_true')
+    parser.add_argument(
+        '-n', '--num-topics',
+        help='The number of topics of a retrained model.',
+        type=int,
+        default=NUM_TOPICS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    print(refresh(num_topics=args.num_topics, force_retrain=args.retrain))
@@ -0,0 +1,144 @@
+"""Disk-backed bag-of-words corpora for the topic models.
+Documents are streamed from the database or the Parquet archive and
+serialized to a Matrix Market file with its offset index:
+
+    <directory>/dictionary.dict   the gensim Dictionary
+    <directory>/corpus.mm         one bag of words per document
+    <directory>/corpus.mm.index   offsets of the documents
+
+The resulting `MmCorpus` streams the documents from disk every time it is
+iterated and supports `len` and random access, so LDA and DTM training run
+in bounded memory whatever the size of the corpus. Building it takes two
+passes over the source: one for the dictionary, one for the bags of words.
+"""
+import itertools
+import os
+
+import gensim
+import numpy as np
+from gensim.corpora import Dictionary, MmCorpus
+from gensim.matutils import corpus2csc
+from scipy.sparse import csc_matrix, hstack
+
+from database.engine import get_engine
+from database.reader import read_articles
+
+CHUNK_SIZE = 10000
+
+
+def tokenize(text):
+    return gensim.utils.simple_preprocess(str(text), deacc=True)
+
+
+class DatabaseTexts(object):
+    """Re-iterable stream of the tokenized title and text of the stored
+    articles, filtered like `read_articles`."""
+
+    def __init__(self, engine=None, start=None, end=None, countries=None, cities=None, chunksize=CHUNK_SIZE):
+        self.engine = engine
+        self.start = start
+        self.end = end
+        self.countries = countries
+        self.cities = cities
+        self.chunksize = chunksize
+
+    def __iter__(self):
+        connection = (self.engine or get_engine()).connect()
+        try:
+            for chunk in read_articles(connection, columns=['title', 'article_text'], start=self.start,
+                                       end=self.end, countries=self.countries, cities=self.cities,
+                                       chunksize=self.chunksize):
+                for title, text in zip(chunk['title'], chunk['article_text']):
+                    yield tokenize(title + ' ' + text)
+        finally:
+            connection.close()
+
+
+class ArchiveTexts(object):
+    """Re-iterable stream of the tokenized title and text of the archived
+    articles, filtered like `iter_archive`."""
+
+    def __init__(self, countries=None, sources=None, start=None, end=None, archive_dir=None):
+        self.countries = countries
+        self.sources = sources
+        self.start = start
+        self.end = end
+        self.archive_dir = archive_dir
+
+    def __iter__(self):
+        # The archive needs pyarrow, which the database path does not.
+        from webcrawler.archive import ARCHIVE, iter_archive
+        for batch in iter_archive(columns=['title', 'article_text'], countries=self.countries,
+                                  sources=self.sources, start=self.start, end=self.end,
+                                  archive_dir=self.archive_dir or ARCHIVE):
+            for title, text in zip(batch['title'], batch['article_text']):
+                yield tokenize(title + ' ' + text)
+
+
+def _paths(directory):
+    return os.path.join(directory, 'dictionary.dict'), os.path.join(directory, 'corpus.mm')
+
+
+def build_corpus(texts, directory, dictionary=None, **filter_args):
+    """Serializes the bags of words of `texts`, a re-iterable of token
+    lists, under `directory`. The dictionary is built from `texts` unless
+    given, then filtered with `filter_args` (see
+    `Dictionary.filter_extremes`) if any. Returns the corpus and the
+    dictionary."""
+    os.makedirs(directory, exist_ok=True)
+    dictionary_path, corpus_path = _paths(directory)
+    if dictionary is None:
+        dictionary = Dictionary(texts)
+        if filter_args:
+            dictionary.filter_extremes(**filter_args)
+    dictionary.save(dictionary_path)
+    MmCorpus.serialize(corpus_path, (dictionary.doc2bow(tokens) for tokens in texts), id2word=dictionary)
+    return MmCorpus(corpus_path), dictionary
+
+
+def load_corpus(directory):
+    """Returns the corpus and dictionary serialized under `directory`."""
+    dictionary_path, corpus_path = _paths(directory)
+    return MmCorpus(corpus_path), Dictionary.load(dictionary_path)
+
+
+def chunks(corpus, chunksize=CHUNK_SIZE):
+    """Yields the documents of `corpus` in lists of at most `chunksize`."""
+    documents = iter(corpus)
+    while True:
+        chunk = list(itertools.islice(documents, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def rewrite_corpus(corpus, dictionary, directory, transform, chunksize=CHUNK_SIZE):
+    """Serializes under `directory`, in place of any corpus there, the
+    documents of `corpus` passed through `transform`, a function of a list
+    of documents returning as many documents, `chunksize` documents at a
+    time. Returns the new corpus."""
+    os.makedirs(directory, exist_ok=True)
+    dictionary_path, corpus_path = _paths(directory)
+    dictionary.save(dictionary_path)
+    tmp_path = corpus_path + '.tmp'
+    MmCorpus.serialize(tmp_path, (document for chunk in chunks(corpus, chunksize) for document in transform(chunk)),
+                       id2word=dictionary)
+    os.replace(tmp_path, corpus_path)
+    os.replace(tmp_path + '.index', corpus_path + '.index')
+    return MmCorpus(corpus_path)
+
+
+def slice_term_counts(corpus, time_slices, num_terms, chunksize=CHUNK_SIZE):
+    """Returns the sparse `num_terms` x `len(time_slices)` matrix of the
+    term counts of each time slice of `corpus`, whose documents are ordered
+    by time slice, `chunksize` documents at a time."""
+    documents = iter(corpus)
+    columns = []
+    for size in time_slices:
+        counts = np.zeros((num_terms, 1), dtype=np.int64)
+        for chunk in chunks(itertools.islice(documents, int(size)), chunksize):
+            counts += corpus2csc(chunk, num_terms=num_terms, dtype=np.int64).sum(axis=1)
+        columns.append(csc_matrix(counts))
+    if not columns:
+        return csc_matrix((num_terms, 0), dtype=np.int64)
+    return hstack(columns, format='csc')
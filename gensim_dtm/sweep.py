@@ -0,0 +1,238 @@
+"""Hyperparameter sweep of the topic models.
+Trains an LDA model for every combination of the number of topics, alpha,
+eta and tf-idf pruning threshold on a pool of worker processes, and scores
+each one with its topic coherence on the training documents and its
+perplexity on held-out documents: every `HOLDOUT_EVERY`th article, never
+pruned so all candidates are measured on the same words, at most
+`HELD_OUT_SIZE` of them. The results and timings are written to
+
+    MODELS/sweep/<run>/results.csv
+
+The best candidate is the most coherent one among those whose held-out
+perplexity is within `PERPLEXITY_TOLERANCE` of the lowest. Unless run
+with --no-promote, it is saved as the latest version of the city or country
+model (see `gensim_dtm.topic_builder`), with the data version read before
+the sweep, and later rebuilds keep its hyperparameters. Run it with e.g.
+
+    python -m gensim_dtm.sweep --city Juba -k 5 10 15 20
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import gensim
+import pandas as pd
+from gensim.corpora import Dictionary
+from gensim.models import CoherenceModel, LdaModel
+
+from database.engine import get_engine
+from database.news_queries import get_data_version
+from gensim_dtm.gensim_lda import LOW_VALUE, prune_low_tfidf
+from gensim_dtm.online_lda import perplexity
+from gensim_dtm.streaming_corpus import DatabaseTexts, build_corpus, load_corpus, rewrite_corpus
+from gensim_dtm.topic_builder import MODELS, save_version
+
+SWEEP_DIR = os.path.join(MODELS, 'sweep')
+SWEEP_WORKERS = os.cpu_count() or 1
+NUM_TOPICS_GRID = (5, 10, 15, 20)
+ALPHA_GRID = ('symmetric', 'asymmetric')
+# The promoted models are retrained with LdaMulticore, which cannot learn alpha.
+UNSUPPORTED_ALPHAS = ('auto',)
+ETA_GRID = ('symmetric', 'auto')
+LOW_VALUE_GRID = (0.1, LOW_VALUE)
+HOLDOUT_EVERY = 10
+HELD_OUT_SIZE = 10000
+COHERENCE = 'u_mass'
+PERPLEXITY_TOLERANCE = 1.1
+PASSES = 2
+RANDOM_STATE = 1
+
+
+class _Split(object):
+    """Re-iterable view of the held-out documents of `texts`, or of the
+    others."""
+
+    def __init__(self, texts, held_out):
+        self.texts = texts
+        self.held_out = held_out
+
+    def __iter__(self):
+        for i, tokens in enumerate(self.texts):
+            if (i % HOLDOUT_EVERY == 0) == self.held_out:
+                yield tokens
+
+
+def _pruned_dir(run_dir, low_value):
+    return os.path.join(run_dir, 'pruned-{}'.format(low_value))
+
+
+def prepare(texts, run_dir, low_values):
+    """Serializes the training and held-out corpora of `texts` under
+    `run_dir`, and the training corpus pruned at each of `low_values`.
+    Returns the number of training documents."""
+    dictionary = Dictionary(texts)
+    train, _ = build_corpus(_Split(texts, False), os.path.join(run_dir, 'train'), dictionary)
+    build_corpus(_Split(texts, True), os.path.join(run_dir, 'held_out'), dictionary)
+    tfidf = gensim.models.TfidfModel(train, dictionary)
+    for low_value in low_values:
+        rewrite_corpus(train, dictionary, _pruned_dir(run_dir, low_value),
+                       lambda chunk: prune_low_tfidf(chunk, tfidf, len(dictionary), low_value))
+    return len(train)
+
+
+def train_candidate(run_dir, candidate_id, num_topics, alpha, eta, low_value):
+    """Trains and scores one candidate. Runs in a worker process. Returns
+    its row of the results."""
+    start = time.perf_counter()
+    corpus, dictionary = load_corpus(_pruned_dir(run_dir, low_value))
+    model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, alpha=alpha, eta=eta,
+                     passes=PASSES, random_state=RANDOM_STATE)
+    trained = time.perf_counter()
+    coherence = CoherenceModel(model=model, corpus=corpus, dictionary=dictionary,
+                               coherence=COHERENCE).get_coherence()
+    held_out, _ = load_corpus(os.path.join(run_dir, 'held_out'))
+    held_out_perplexity = perplexity(model, itertools.islice(held_out, HELD_OUT_SIZE))
+    path = os.path.join(run_dir, 'candidate-{}'.format(candidate_id), 'lda.model')
+    os.makedirs(os.path.dirname(path))
+    model.save(path)
+    return {'candidate': candidate_id,
+            'num_topics': num_topics,
+            'alpha': alpha,
+            'eta': eta,
+            'low_value': low_value,
+            'coherence': coherence,
+            'perplexity': held_out_perplexity,
+            'train_seconds': trained - start,
+            'score_seconds': time.perf_counter() - trained,
+            'model': path}
+
+
+def best_candidate(results):
+    """Returns the row of the most coherent candidate among those within
+    `PERPLEXITY_TOLERANCE` of the lowest held-out perplexity."""
+    scored = results.dropna(subset=['coherence'])
+    if scored['perplexity'].notna().any():
+        scored = scored[scored['perplexity'] <= PERPLEXITY_TOLERANCE * scored['perplexity'].min()]
+    return scored.sort_values(['coherence', 'perplexity'], ascending=[False, True]).iloc[0]
+
+
+def sweep(texts, run_dir, num_topics_grid=NUM_TOPICS_GRID, alpha_grid=ALPHA_GRID, eta_grid=ETA_GRID,
+          low_value_grid=LOW_VALUE_GRID, workers=SWEEP_WORKERS):
+    """Trains and scores every candidate of the grid on `texts`, a
+    re-iterable of token lists. Writes and returns the results table,
+    ordered by decreasing coherence."""
+    unsupported = [alpha for alpha in alpha_grid if alpha in UNSUPPORTED_ALPHAS]
+    if unsupported:
+        raise ValueError("unsupported alpha {}".format(unsupported))
+    start = time.perf_counter()
+    num_documents = prepare(texts, run_dir, low_value_grid)
+    print('Prepared {} training documents in {:.1f} s'.format(num_documents, time.perf_counter() - start))
+    grid = list(itertools.product(num_topics_grid, alpha_grid, eta_grid, low_value_grid))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(train_candidate, run_dir, i, *params) for i, params in enumerate(grid)]
+        rows = []
+        for params, future in zip(grid, futures):
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                print(f"Candidate {params} failed: '{e}'")
+    results = pd.DataFrame(rows, columns=['candidate', 'num_topics', 'alpha', 'eta', 'low_value', 'coherence',
+                                          'perplexity', 'train_seconds', 'score_seconds', 'model'])
+    results = results.sort_values('coherence', ascending=False)
+    results.to_csv(os.path.join(run_dir, 'results.csv'), index=False)
+    return results
+
+
+def promote(best, scope, name, run_dir, data_version, models_dir=MODELS):
+    """Saves the model of the `best` candidate of the sweep in `run_dir` as
+    the latest model of the city or country `name`. `data_version` must be
+    read before the sweep read the articles, so that articles ingested
+    during the sweep still trigger a rebuild. Returns its meta data."""
+    num_documents = len(load_corpus(os.path.join(run_dir, 'train'))[0])
+    return save_version(LdaModel.load(best['model']), {
+        'scope': scope,
+        'name': name,
+        'data_version': data_version,
+        'num_topics': int(best['num_topics']),
+        'params': {'alpha': best['alpha'], 'eta': best['eta'], 'low_value': float(best['low_value'])},
+        'num_documents': num_documents,
+        'coherence': float(best['coherence']),
+        'perplexity': None if pd.isna(best['perplexity']) else float(best['perplexity']),
+        'sweep': os.path.basename(run_dir)}, models_dir)
+
+
+def _grid_value(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _alpha(value):
+    if value in UNSUPPORTED_ALPHAS:
+        raise argparse.ArgumentTypeError("alpha '{}' is not supported by LdaMulticore".format(value))
+    return _grid_value(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument('--city', help='Sweep the model of this city.')
+    scope.add_argument('--country', help='Sweep the model of this country.')
+    parser.add_argument(
+        '-k', '--num-topics',
+        help='The numbers of topics to try.',
+        type=int,
+        nargs='+',
+        default=NUM_TOPICS_GRID)
+    parser.add_argument(
+        '-a', '--alpha',
+        help="The alphas to try: 'symmetric', 'asymmetric' or numbers.",
+        type=_alpha,
+        nargs='+',
+        default=ALPHA_GRID)
+    parser.add_argument(
+        '-e', '--eta',
+        help="The etas to try: 'symmetric', 'auto' or numbers.",
+        type=_grid_value,
+        nargs='+',
+        default=ETA_GRID)
+    parser.add_argument(
+        '-l', '--low-value',
+        help='The tf-idf pruning thresholds to try.',
+        type=float,
+        nargs='+',
+        default=LOW_VALUE_GRID)
+    parser.add_argument(
+        '-w', '--workers',
+        help='The number of worker processes.',
+        type=int,
+        default=SWEEP_WORKERS)
+    parser.add_argument(
+        '--no-promote',
+        help='Only record the results.',
+        action='store_true')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.city is not None:
+        scope, name, texts = 'city', args.city, DatabaseTexts(cities=[args.city])
+    else:
+        scope, name, texts = 'country', args.country, DatabaseTexts(countries=[args.country])
+    connection = get_engine().connect()
+    data_version = get_data_version(connection, **{scope: name})
+    connection.close()
+    run_dir = os.path.join(SWEEP_DIR, '{}-{}-{}'.format(scope, name, time.strftime('%Y%m%dT%H%M%S')))
+    results = sweep(texts, run_dir, args.num_topics, args.alpha, args.eta, args.low_value, args.workers)
+    print(results.drop(columns='model').to_string(index=False))
+    if results.empty:
+        print('No candidate could be trained')
+    elif not args.no_promote:
+        best = best_candidate(results)
+        meta = promote(best, scope, name, run_dir, data_version)
+        print('Promoted candidate {} as version {} of the {} model of {}'.format(
+            best['candidate'], meta['version'], scope, name))
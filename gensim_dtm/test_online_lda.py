@@ -0,0 +1,35 @@
+"""Tests of the online updates of the collection topic model."""
+from gensim.models import LdaModel
+
+from gensim_dtm.online_lda import build_dictionary, drift, grow_vocabulary
+
+FREQUENT = ['say', 'sudan', 'oil']
+TRAINING = ([FREQUENT + ['river', 'nile', 'water']] * 10 + [FREQUENT + ['army', 'peace', 'talks']] * 10)
+NEW = [FREQUENT + ['river', 'nile', 'water', 'army', 'election']] * 3
+
+
+def train(documents):
+    dictionary, removed = build_dictionary(documents)
+    model = LdaModel([dictionary.doc2bow(document) for document in documents], id2word=dictionary,
+                     num_topics=2, random_state=1)
+    return model, dictionary, {'baseline_perplexity': None, 'removed_tokens': removed}
+
+
+def test_filtered_words_are_not_out_of_vocabulary():
+    model, dictionary, state = train(TRAINING)
+    assert state['removed_tokens'] == sorted(FREQUENT)
+    reason, _ = drift(model, dictionary, NEW, state)
+    assert reason is None
+
+
+def test_new_words_drift():
+    model, dictionary, state = train(TRAINING)
+    reason, _ = drift(model, dictionary, [['election', 'vote', 'ballot', 'river']] * 3, state)
+    assert reason == 'out of vocabulary rate 0.75'
+
+
+def test_filtered_words_are_not_added_back():
+    model, dictionary, state = train(TRAINING)
+    assert grow_vocabulary(model, dictionary, NEW, set(state['removed_tokens'])) == ['election']
+    assert not set(FREQUENT) & set(dictionary.token2id)
+    assert model.state.sstats.shape == (2, len(dictionary))
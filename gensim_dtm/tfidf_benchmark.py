@@ -0,0 +1,74 @@
+"""Benchmark of the tf-idf pruning of `perform_lda`.
+The corpus is synthetic: documents of Poisson distributed lengths drawn from
+a Zipf distributed vocabulary, like the words of news articles. The reference
+is the original per-document loop, and the pruned corpora of both are checked
+to be identical.
+"""
+import argparse
+import time
+
+import numpy as np
+import gensim
+import gensim.corpora as corpora
+from gensim_dtm.gensim_lda import LOW_VALUE, prune_low_tfidf
+
+
+def reference_prune_low_tfidf(corpus, tfidf, low_value=LOW_VALUE):
+    corpus = list(corpus)
+    for i in range(0, len(corpus)):
+        bow = corpus[i]
+        tfidf_ids = [id for id, value in tfidf[bow]]
+        bow_ids = [id for id, value in bow]
+        low_value_words = [id for id, value in tfidf[bow] if value < low_value]
+        words_missing_in_tfidf = [id for id in bow_ids if id not in tfidf_ids]
+        new_bow = [b for b in bow if b[0] not in low_value_words and b[0] not in words_missing_in_tfidf]
+        corpus[i] = new_bow
+    return corpus
+
+
+def make_corpus(num_docs, num_terms, doc_length, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for length in rng.poisson(doc_length, num_docs):
+        words = (rng.zipf(1.3, length) - 1) % num_terms
+        ids, counts = np.unique(words, return_counts=True)
+        corpus.append(list(zip(ids.tolist(), counts.tolist())))
+    id2word = corpora.Dictionary.from_corpus(corpus, {i: 'w{}'.format(i) for i in range(num_terms)})
+    return corpus, id2word
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--num-docs',
+        help='Number of documents of the corpus.',
+        type=int,
+        default=100000)
+    parser.add_argument(
+        '-t', '--num-terms',
+        help='Size of the vocabulary.',
+        type=int,
+        default=50000)
+    parser.add_argument(
+        '-l', '--doc-length',
+        help='Mean number of words of a document.',
+        type=int,
+        default=300)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    corpus, id2word = make_corpus(args.num_docs, args.num_terms, args.doc_length)
+    tfidf = gensim.models.TfidfModel(corpus, id2word)
+    print('{} documents, {} terms'.format(len(corpus), len(id2word)))
+    start = time.perf_counter()
+    expected = reference_prune_low_tfidf(corpus, tfidf)
+    before = time.perf_counter() - start
+    start = time.perf_counter()
+    result = prune_low_tfidf(corpus, tfidf, len(id2word))
+    after = time.perf_counter() - start
+    assert result == expected, 'pruned corpus differs from the reference'
+    print('before: {:8.2f} s'.format(before))
+    print('after:  {:8.2f} s'.format(after))
+    print('speedup: {:.1f}x'.format(before / after))
@@ -0,0 +1,201 @@
+"""Per-city and per-country topic models, trained off the request path.
+The crawler submits the cities and countries it stored articles for to a
+`TopicBuilder`, which trains their LDA models on a background thread and
+saves them as versioned artifacts:
+
+    MODELS/<scope>/<name>/<version>/lda.model   the gensim model
+    MODELS/<scope>/<name>/<version>/meta.json   data version, size and topics
+    MODELS/<scope>/<name>/latest                name of the latest version
+
+A model is only retrained when the data version of its city or country
+changed since the latest one, with the number of topics and the
+hyperparameters of the latest one, e.g. those promoted by
+`gensim_dtm.sweep`. The dashboards read the topics of the latest
+version from its meta.json, so their latency does not depend on the size of
+the corpus.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from queue import Queue
+
+from database.engine import get_engine
+from database.news_queries import get_city_names, get_data_version
+from database.token_store import load_city_tokens, load_country_tokens
+
+MODELS = os.environ.get('NEWS_MODELS_DIR', 'MODELS')
+NUM_TOPICS = 10
+NUM_WORDS = 10
+KEEP_VERSIONS = 3
+
+LOADERS = {'city': load_city_tokens, 'country': load_country_tokens}
+
+
+def model_dir(scope, name, models_dir=MODELS):
+    return os.path.join(models_dir, scope, re.sub(r'[^\w-]', '_', name))
+
+
+def _write_atomic(path, text):
+    tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(tmp_path, 'w') as outfile:
+        outfile.write(text)
+    os.replace(tmp_path, path)
+
+
+def latest_version(scope, name, models_dir=MODELS):
+    """Returns the latest version of the model of `name`, None if there is
+    none yet."""
+    try:
+        with open(os.path.join(model_dir(scope, name, models_dir), 'latest')) as infile:
+            return infile.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load_latest(scope, name, models_dir=MODELS):
+    """Returns the meta data of the latest model of `name`, with its
+    'topics' as lists of (word, weight), None if there is none yet."""
+    version = latest_version(scope, name, models_dir)
+    if version is None:
+        return None
+    with open(os.path.join(model_dir(scope, name, models_dir), version, 'meta.json')) as infile:
+        return json.load(infile)
+
+
+def load_latest_model(scope, name, models_dir=MODELS):
+    """Returns the latest gensim model of `name`, None if there is none."""
+    from gensim.models import LdaModel
+    version = latest_version(scope, name, models_dir)
+    if version is None:
+        return None
+    return LdaModel.load(os.path.join(model_dir(scope, name, models_dir), version, 'lda.model'))
+
+
+def _prune(directory, keep):
+    versions = sorted(entry for entry in os.listdir(directory)
+                      if os.path.isdir(os.path.join(directory, entry)) and not entry.startswith('.'))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, version), ignore_errors=True)
+
+
+def _no_progress(fraction, message=None, partial=None):
+    pass
+
+
+def save_version(lda_model, meta, models_dir=MODELS):
+    """Saves `lda_model` as a new version of the model of
+    `meta['scope']` and `meta['name']` and makes it the latest. `meta` is
+    completed with the version, creation time and topics. Returns it."""
+    directory = model_dir(meta['scope'], meta['name'], models_dir)
+    version = time.strftime('%Y%m%dT%H%M%S', time.gmtime()) + '-' + uuid.uuid4().hex[:8]
+    tmp_dir = os.path.join(directory, '.' + version)
+    os.makedirs(tmp_dir)
+    lda_model.save(os.path.join(tmp_dir, 'lda.model'))
+    meta = dict(meta,
+                version=version,
+                created=time.time(),
+                topics=[[topic_id, [[word, float(weight)] for word, weight in words]]
+                        for topic_id, words in lda_model.show_topics(num_topics=meta['num_topics'],
+                                                                     num_words=NUM_WORDS, formatted=False)])
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as outfile:
+        json.dump(meta, outfile)
+    os.replace(tmp_dir, os.path.join(directory, version))
+    _write_atomic(os.path.join(directory, 'latest'), version)
+    _prune(directory, KEEP_VERSIONS)
+    return meta
+
+
+def build_model(connection, scope, name, num_topics=None, force=False, models_dir=MODELS,
+                progress=_no_progress):
+    """Trains and saves a new version of the model of the city or country
+    `name`, unless the latest one was trained on the current data. Returns
+    the meta data of the latest model, None if there are no articles.
+    `num_topics` and the other hyperparameters default to those of the
+    latest model. `progress` is called with the fraction of the work done
+    and a message at every step."""
+    # Imported here so that readers of the models do not load the LDA stack.
+    from gensim_dtm.gensim_lda import perform_lda
+    data_version = get_data_version(connection, **{scope: name})
+    latest = load_latest(scope, name, models_dir)
+    params = latest.get('params', {}) if latest is not None else {}
+    if num_topics is None:
+        num_topics = latest['num_topics'] if latest is not None else NUM_TOPICS
+    if not force and latest is not None and latest['data_version'] == data_version \
+            and latest['num_topics'] == num_topics:
+        return latest
+    progress(0.1, 'loading the articles')
+    news_df = LOADERS[scope](connection, name)
+    if news_df.empty:
+        return None
+    progress(0.3, 'training on {} articles'.format(len(news_df)))
+    lda_model = perform_lda(news_df, num_topics=num_topics, **params)
+    progress(0.9, 'saving the model')
+    return save_version(lda_model, {'scope': scope,
+                                    'name': name,
+                                    'data_version': data_version,
+                                    'num_topics': num_topics,
+                                    'params': params,
+                                    'num_documents': len(news_df)}, models_dir)
+
+
+class TopicBuilder(object):
+    """Trains the submitted models one at a time on a background thread.
+    A model that is already waiting is not submitted twice."""
+
+    def __init__(self, num_topics=None, models_dir=MODELS):
+        self.num_topics = num_topics
+        self.models_dir = models_dir
+        self._queue = Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def submit(self, scope, name):
+        if name is None:
+            return
+        with self._lock:
+            if (scope, name) in self._pending:
+                return
+            self._pending.add((scope, name))
+        self._queue.put((scope, name))
+
+    def _work(self):
+        while True:
+            scope, name = self._queue.get()
+            with self._lock:
+                self._pending.discard((scope, name))
+            try:
+                connection = get_engine().connect()
+                try:
+                    build_model(connection, scope, name, self.num_topics, models_dir=self.models_dir)
+                finally:
+                    connection.close()
+            except Exception as e:
+                print(f"Building the {scope} model of '{name}' failed: '{e}'")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Waits until every submitted model is built."""
+        self._queue.join()
+
+
+def build_all(connection, num_topics=None, force=False):
+    """Builds the model of every city and country."""
+    countries = [row[0] for row in connection.execute("SELECT name FROM countries")]
+    for scope, names in (('city', get_city_names(connection)), ('country', countries)):
+        for name in names:
+            meta = build_model(connection, scope, name, num_topics, force)
+            if meta is not None:
+                print('{} {}: version {} on {} articles'.format(scope, name, meta['version'], meta['num_documents']))
+
+
+if __name__ == '__main__':
+    connection = get_engine().connect()
+    build_all(connection)
+    connection.close()
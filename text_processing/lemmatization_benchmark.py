@@ -0,0 +1,68 @@
+"""Benchmark of `convert_to_raw_text` against the batch API.
+The documents are the titles and texts of the articles of the Parquet
+archive written by the crawler (see `webcrawler.archive`).
+The reference is the original one-document-at-a-time implementation, and the
+outputs of both are checked to be identical.
+"""
+import argparse
+import time
+
+from nltk import word_tokenize, pos_tag
+from text_processing.nltk_resources import ensure_resources
+from text_processing.text_processing_utils import convert_to_raw_text_batch, lemmatizer, remove_stopwords
+from webcrawler.archive import ARCHIVE, read_archive
+
+
+def reference_convert_to_raw_text(text):
+    lemmatized_text = [lemmatizer.lemmatize(i, j[0].lower()).lower() if j[0].lower() in ['a', 'n', 'v'] else lemmatizer.lemmatize(i) for i, j in pos_tag(word_tokenize(text))]
+    lemmatized_text = remove_stopwords(lemmatized_text)
+    lemmatized_text_without_empty_lists = [x for x in lemmatized_text if x != []]
+    lemmatized_individual_word_list = [x[0] for x in lemmatized_text_without_empty_lists]
+    return ' '.join(lemmatized_individual_word_list)
+
+
+def load_documents(archive_dir, limit=None):
+    articles = read_archive(columns=['title', 'article_text'], archive_dir=archive_dir)
+    if limit is not None:
+        articles = articles.head(limit)
+    documents = []
+    for title, text in zip(articles['title'], articles['article_text']):
+        documents.extend([title, text])
+    return documents
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-a', '--archive',
+        help='Directory of the Parquet archive.',
+        type=str,
+        default=ARCHIVE)
+    parser.add_argument(
+        '-n', '--num-articles',
+        help='Number of articles to process (default: all).',
+        type=int,
+        default=None)
+    parser.add_argument(
+        '-p', '--processes',
+        help='Number of worker processes of the batch API.',
+        type=int,
+        default=None)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    ensure_resources()
+    documents = load_documents(args.archive, args.num_articles)
+    print('{} documents'.format(len(documents)))
+    if documents:
+        start = time.perf_counter()
+        expected = [reference_convert_to_raw_text(document) for document in documents]
+        before = len(documents) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        result = convert_to_raw_text_batch(documents, args.processes)
+        after = len(documents) / (time.perf_counter() - start)
+        assert result == expected, 'batch output differs from the reference'
+        print('before: {:8.1f} docs/s'.format(before))
+        print('after:  {:8.1f} docs/s'.format(after))
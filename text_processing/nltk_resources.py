@@ -0,0 +1,51 @@
+"""NLTK resources used by the text processing.
+Resources are looked up in a local data directory, `NLTK_DATA_DIR` from the
+environment (default: ~/nltk_data), when they are first needed. Nothing is
+downloaded at run time; provision the directory once with
+
+    python -m text_processing.nltk_resources
+"""
+import os
+import threading
+import nltk
+
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR', os.path.join(os.path.expanduser('~'), 'nltk_data'))
+
+RESOURCES = {
+    'wordnet': 'corpora/wordnet',
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'stopwords': 'corpora/stopwords',
+}
+
+_checked = set()
+_lock = threading.Lock()
+
+
+def ensure_resources(*names):
+    """Checks that the resources `names` (default: all) are installed, the
+    first time they are needed. Raises LookupError otherwise."""
+    names = names or tuple(RESOURCES)
+    with _lock:
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        for name in names:
+            if name in _checked:
+                continue
+            try:
+                nltk.data.find(RESOURCES[name])
+            except LookupError:
+                raise LookupError("NLTK resource '{}' is missing from {}, run "
+                                  "`python -m text_processing.nltk_resources` "
+                                  "to install it".format(name, NLTK_DATA_DIR))
+            _checked.add(name)
+
+
+def provision(download_dir=NLTK_DATA_DIR):
+    """Downloads every resource into `download_dir`."""
+    for name in RESOURCES:
+        nltk.download(name, download_dir=download_dir)
+
+
+if __name__ == '__main__':
+    provision()
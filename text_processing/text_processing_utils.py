@@ -1,31 +1,97 @@
+import multiprocessing
+import os
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from nltk.stem import WordNetLemmatizer
-import nltk
-from nltk import word_tokenize, pos_tag
+from nltk import word_tokenize, pos_tag, pos_tag_sents
 from gensim.utils import simple_preprocess
 from nltk.corpus import stopwords
-
-nltk.download('wordnet')
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('stopwords')
+from text_processing.nltk_resources import ensure_resources
 
 lemmatizer = WordNetLemmatizer()
 
-stop_words = stopwords.words('english')
-stop_words.extend(['from', 'subject', 're', 'edu', 'use'])
+# Bump whenever the output of convert_to_raw_text changes, so that the tokens
+# stored in the article_tokens table are recomputed.
+PIPELINE_VERSION = 1
+LEMMA_CACHE_SIZE = 200000
+# Smallest number of texts sent to a worker at once, so that each round trip
+# tags several texts with one pos_tag_sents call.
+MIN_CHUNK_SIZE = 8
+# The pool is created from the crawler threads; a forked worker could inherit
+# a lock held by another thread, such as the one of `ensure_resources`, and
+# block forever. Workers are started from a clean process instead.
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    """Returns the stopwords as a frozenset, loading them on first use."""
+    ensure_resources()
+    stop_words = stopwords.words('english')
+    stop_words.extend(['from', 'subject', 're', 'edu', 'use'])
+    return frozenset(stop_words)
 
 
 def remove_stopwords(texts):
+    stop_word_set = get_stop_words()
     return [[word for word in simple_preprocess(str(doc))
-             if word not in stop_words] for doc in texts]
+             if word not in stop_word_set] for doc in texts]
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def clean_token(token, tag):
+    """Returns the lemma of a tagged token after lowercasing and stopword
+    removal, or None if nothing is left of it."""
+    pos = tag[0].lower()
+    lemma = lemmatizer.lemmatize(token, pos).lower() if pos in ['a', 'n', 'v'] else lemmatizer.lemmatize(token)
+    stop_word_set = get_stop_words()
+    for word in simple_preprocess(str(lemma)):
+        if word not in stop_word_set:
+            return word
+    return None
+
+
+def _join_tagged(tagged_tokens):
+    return ' '.join(word for word in (clean_token(i, j) for i, j in tagged_tokens) if word is not None)
 
 
 def convert_to_raw_text(text):
-    lemmatized_text = [lemmatizer.lemmatize(i, j[0].lower()).lower() if j[0].lower() in ['a', 'n', 'v'] else lemmatizer.lemmatize(i) for i, j in pos_tag(word_tokenize(text))]
-    lemmatized_text = remove_stopwords(lemmatized_text)
-    lemmatized_text_without_empty_lists = [x for x in lemmatized_text if x != []]
-    lemmatized_individual_word_list = [x[0] for x in lemmatized_text_without_empty_lists]
-    lemmatized_text_lowercase = ' '.join(lemmatized_individual_word_list)
-    print(lemmatized_text_lowercase)
-    return lemmatized_text_lowercase
\ No newline at end of file
+    ensure_resources()
+    return _join_tagged(pos_tag(word_tokenize(text)))
+
+
+def _convert_chunk(texts):
+    ensure_resources()
+    return [_join_tagged(tagged) for tagged in pos_tag_sents([word_tokenize(text) for text in texts])]
+
+
+def _get_pool(processes):
+    global _pool
+    # The crawler cleans batches from several threads at once.
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes,
+                                        mp_context=multiprocessing.get_context(POOL_START_METHOD))
+        return _pool
+
+
+def convert_to_raw_text_batch(texts, processes=None):
+    """Applies `convert_to_raw_text` to every text of `texts`.
+    The texts are split into chunks that are processed by a shared pool of
+    worker processes, created on first use with `processes` workers (default:
+    one per core). Each worker keeps its own memo of lemmatized tokens. With
+    `processes=1` everything runs in the calling process."""
+    texts = list(texts)
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(texts) <= MIN_CHUNK_SIZE:
+        return _convert_chunk(texts)
+    chunksize = max(MIN_CHUNK_SIZE, len(texts) // (processes * 4))
+    chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+    results = []
+    for chunk in _get_pool(processes).map(_convert_chunk, chunks):
+        results.extend(chunk)
+    return results
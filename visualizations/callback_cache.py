@@ -0,0 +1,178 @@
+"""Server-side memoization of the dashboard callbacks.
+Results are keyed by the name of the callback, its inputs and the data
+version stamp of the data it reads (see `database.news_queries`). Ingest
+changes the stamp of the cities it stores articles for, so their cached
+results are never served again, while the views of the other cities stay
+cached. Stale entries leave the cache through its size bound and TTL.
+
+The backend is chosen with DASH_CACHE_BACKEND:
+
+    memory  size-bounded LRU with a TTL, per process (default)
+    disk    pickled results under DASH_CACHE_DIR, shared by the processes
+    redis   any Redis-compatible server at DASH_CACHE_REDIS_URL
+"""
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get('DASH_CACHE_BACKEND', 'memory')
+CACHE_DIR = os.environ.get('DASH_CACHE_DIR', os.path.join('ARTICLES', 'DASH_CACHE'))
+CACHE_REDIS_URL = os.environ.get('DASH_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_SIZE = int(os.environ.get('DASH_CACHE_SIZE', 256))
+CACHE_TTL = int(os.environ.get('DASH_CACHE_TTL', 3600))
+
+_MISSING = object()
+
+
+class LruTtlCache(object):
+    """In-memory cache of at most `maxsize` entries, each kept for at most
+    `ttl` seconds."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache(object):
+    """Cache of pickled values in `directory`, each kept for at most `ttl`
+    seconds and at most `maxsize` entries, the least recently used first
+    removed."""
+
+    def __init__(self, directory=CACHE_DIR, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return default
+            with open(path, 'rb') as infile:
+                value = pickle.load(infile)
+            # The access time is what the LRU eviction orders the entries by.
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'wb') as outfile:
+            pickle.dump(value, outfile, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pickle')]
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_atime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pickle'):
+                os.remove(entry.path)
+
+
+class RedisCache(object):
+    """Cache of pickled values in a Redis-compatible server, expired by the
+    server after `ttl` seconds. `client` is any object with the get, setex
+    and delete methods of redis.Redis."""
+
+    def __init__(self, client, ttl=CACHE_TTL, prefix='dash-cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=CACHE_REDIS_URL, ttl=CACHE_TTL):
+        import redis
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, key, default=None):
+        value = self.client.get(self.prefix + key)
+        return default if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def make_cache(backend=CACHE_BACKEND):
+    """Returns a cache of the `backend` named 'memory', 'disk' or 'redis'."""
+    if backend == 'memory':
+        return LruTtlCache()
+    if backend == 'disk':
+        return DiskCache()
+    if backend == 'redis':
+        return RedisCache.from_url()
+    raise ValueError("unknown cache backend '{}'".format(backend))
+
+
+def cache_key(name, args, version):
+    return hashlib.sha1(repr((name, args, version)).encode('utf-8')).hexdigest()
+
+
+def memoize(cache, data_version):
+    """Decorator caching the results of a callback in `cache`.
+    `data_version` is called with the arguments of the callback and returns
+    the version stamp of the data the callback reads; the result is
+    recomputed when it changes."""
+    def decorator(func):
+        # Callbacks of a module often share their name, the line tells them apart.
+        name = '{}.{}:{}'.format(func.__module__, func.__name__, func.__code__.co_firstlineno)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = cache_key(name, args, data_version(*args))
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*args)
+                cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
@@ -1,46 +1,83 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from datetime import date, timedelta
+from database.engine import pool_status
+from database.news_queries import create_rollup_table, get_city_counts, get_data_version, refresh_city_counts
+from database.search import search_articles
 from database.sqlalchemy_utils import *
-from gensim_dtm.gensim_lda import perform_lda
+from database.token_store import create_token_table
+from gensim_dtm.topic_builder import latest_version, load_latest
+import flask
 import plotly.express as px
-from text_processing.text_processing_utils import convert_to_raw_text
-
-query_city_names = """
-SELECT DISTINCT city FROM collection 
-"""
+from visualizations.callback_cache import make_cache, memoize
+from visualizations.jobs import JobManager, JobQueueFull, count_articles, retrain_city_model
 
 all_teams_df = pd.read_csv('dash_simple_nba_srcdata_shot_dist_compiled_data_2019_20.csv')
 
-conn = create_connection('localhost', 'root', 'Ju5Ky1M@', 'news')
-city_names = list(execute_read_query(conn, query_city_names))
-conn.close()
+engine = create_table()
+create_token_table(engine)
+create_rollup_table(engine)
+
+connection = engine.connect()
+city_df = get_city_counts(connection)
+if city_df.empty:
+    refresh_city_counts(connection)
+    city_df = get_city_counts(connection)
+connection.close()
+city_names = list(city_df['city'])
+
+callback_cache = make_cache()
+job_manager = JobManager()
+
+
+def data_version(city=None):
+    connection = engine.connect()
+    version = get_data_version(connection, city)
+    connection.close()
+    return version
+
 
 app = dash.Dash(__name__)
 server = app.server
+
+
+@server.route('/pool-status')
+def show_pool_status():
+    return flask.jsonify(pool_status())
+
+
 team_names = all_teams_df.group.unique()
 team_names.sort()
 app.layout = html.Div([
     dcc.Graph('news-overview-graph', config={'displayModeBar': False}),
     html.P("Select a city to inspect: "),
-    html.Div([dcc.Dropdown(id='group-select', options=[{'label': i[0], 'value': i[0]} for i in city_names],
-                           value=city_names[0][0], style={'width': '140px'})]),
-    dcc.Graph('specific-news-graph', config={'displayModeBar': False})])
+    html.Div([dcc.Dropdown(id='group-select', options=[{'label': i, 'value': i} for i in city_names],
+                           value=city_names[0], style={'width': '140px'})]),
+    dcc.Graph('specific-news-graph', config={'displayModeBar': False}),
+    html.P("Search the articles: "),
+    dcc.Input(id='search-box', type='text', debounce=True, style={'width': '400px'}),
+    html.Ol(id='search-results'),
+    html.P("Background jobs: "),
+    html.Button('Retrain the topics of the city', id='retrain-button'),
+    dcc.DatePickerRange(id='scan-dates', start_date=date.today() - timedelta(days=365), end_date=date.today()),
+    html.Button('Count the articles of the period', id='scan-button'),
+    dcc.Store(id='job-id'),
+    dcc.Interval(id='job-poll', interval=1000, disabled=True),
+    html.Div(id='job-progress'),
+    dcc.Graph('job-graph', config={'displayModeBar': False})])
 
 
 @app.callback(
     Output('news-overview-graph', 'figure'),
     [Input('group-select', 'value')]
 )
+@memoize(callback_cache, lambda grpname: data_version())
 def update_graph(grpname):
-    conn = create_connection('localhost', 'root', 'Ju5Ky1M@', 'news')
-    city_counts = []
-    for city_name in city_names:
-        count = execute_read_query(conn, "SELECT COUNT(city) FROM collection WHERE city='{}'".format(city_name[0]))
-        city_counts.append([city_name[0], count[0][0]])
-    conn.close()
-    city_df = pd.DataFrame(city_counts, columns=['city', 'count'])
+    connection = engine.connect()
+    city_df = get_city_counts(connection)
+    connection.close()
     return px.pie(city_df, values='count', names='city', title='Proportion of news by city')
 
 
@@ -48,16 +85,12 @@ def update_graph(grpname):
     Output('specific-news-graph', 'figure'),
     [Input('group-select', 'value')]
 )
+@memoize(callback_cache, lambda grpname: latest_version('city', grpname))
 def update_graph(grpname):
-    conn = create_connection('localhost', 'root', 'Ju5Ky1M@', 'news')
-    query_result = execute_read_query(conn, "SELECT title, article_text FROM collection WHERE city='{}'".format(grpname))
-    conn.close()
-    news_df = pd.DataFrame(query_result, columns=['title', 'article_text'])
-    for column in range(0,len(news_df)):
-        news_df.iloc[column]['title'] = convert_to_raw_text(news_df.iloc[column]['title'])
-        news_df.iloc[column]['article_text'] = convert_to_raw_text(news_df.iloc[column]['article_text'])
-    lda_model = perform_lda(news_df, num_topics=10)
-    topic_data_frame = pd.DataFrame(lda_model.show_topics(formatted=False))
+    model = load_latest('city', grpname)
+    if model is None:
+        return px.bar(title='No topic model has been built for {} yet'.format(grpname))
+    topic_data_frame = pd.DataFrame(model['topics'])
     topic_data_frame.loc[:, 'keyword'] = topic_data_frame[1].map(lambda x: x[0][0])
     topic_data_frame.loc[:, 'importance'] = topic_data_frame[1].map(lambda x: x[0][1])
     topic_data_frame['importance'] /= max(topic_data_frame['importance'])
@@ -65,5 +98,70 @@ def update_graph(grpname):
     return px.bar(topic_data_frame, x='keyword', y='importance', title='Key words and their relevance')
 
 
+@app.callback(
+    Output('search-results', 'children'),
+    [Input('search-box', 'value')]
+)
+def update_search(query):
+    if not query:
+        return []
+    connection = engine.connect()
+    results = search_articles(connection, query)
+    connection.close()
+    return [html.Li([html.A(row.title, href=row.url, target='_blank'),
+                     ' ({}, {})'.format(row.city, row.publication_date)])
+            for row in results.itertuples()]
+
+
+@app.callback(
+    Output('job-id', 'data'),
+    [Input('retrain-button', 'n_clicks'), Input('scan-button', 'n_clicks')],
+    [State('group-select', 'value'), State('scan-dates', 'start_date'), State('scan-dates', 'end_date')]
+)
+def submit_job(retrain_clicks, scan_clicks, grpname, start_date, end_date):
+    triggered = dash.callback_context.triggered[0]['prop_id']
+    try:
+        if triggered.startswith('retrain-button') and retrain_clicks:
+            return {'kind': 'retrain', 'id': job_manager.submit(retrain_city_model, grpname)}
+        if triggered.startswith('scan-button') and scan_clicks:
+            return {'kind': 'scan', 'id': job_manager.submit(count_articles, date.fromisoformat(start_date[:10]),
+                                                             date.fromisoformat(end_date[:10]))}
+    except JobQueueFull as e:
+        return {'kind': 'busy', 'error': str(e)}
+    return None
+
+
+def _job_figure(kind, data):
+    if kind == 'scan':
+        return px.bar(x=list(data), y=list(data.values()), title='Articles per city')
+    topic_data_frame = pd.DataFrame(data['topics'])
+    topic_data_frame.loc[:, 'keyword'] = topic_data_frame[1].map(lambda x: x[0][0])
+    topic_data_frame.loc[:, 'importance'] = topic_data_frame[1].map(lambda x: x[0][1])
+    topic_data_frame['importance'] /= max(topic_data_frame['importance'])
+    return px.bar(topic_data_frame, x='keyword', y='importance', title='Key words of the retrained model')
+
+
+@app.callback(
+    [Output('job-progress', 'children'), Output('job-graph', 'figure'), Output('job-poll', 'disabled')],
+    [Input('job-id', 'data'), Input('job-poll', 'n_intervals')]
+)
+def poll_job(job, n_intervals):
+    if not job:
+        return '', px.bar(), True
+    if job['kind'] == 'busy':
+        return job['error'], px.bar(), True
+    status = job_manager.status(job['id'])
+    if status['state'] == 'done':
+        if status['result'] is None:
+            return 'Done, no articles', px.bar(), True
+        return 'Done', _job_figure(job['kind'], status['result']), True
+    if status['state'] in ('failed', 'unknown'):
+        return 'Job {}: {}'.format(status['state'], status.get('error', '')), px.bar(), True
+    progress = '{:.0%} {}'.format(status['progress'], status['message'] or '')
+    if status['partial']:
+        return progress, _job_figure(job['kind'], status['partial']), False
+    return progress, dash.no_update, False
+
+
 if __name__ == '__main__':
     app.run_server(debug=False)
@@ -0,0 +1,153 @@
+"""Background jobs of the dashboards.
+Long computations run on a local pool of worker processes instead of inside
+the callbacks, so the Flask workers stay responsive. A callback submits a job
+and stores its id; an interval callback then polls `JobManager.status` for
+its progress, its partial results and finally its result.
+
+A job is a module-level function taking a `progress` callable as its first
+argument, called as `progress(fraction, message, partial)`. Submitting a job
+that is identical to one that is queued or running returns the id of the
+running one. At most `max_pending` jobs wait or run at a time.
+"""
+import hashlib
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import sqlalchemy
+
+from database.engine import dispose_engine, get_engine
+from database.reader import read_articles
+from database.schema import collection
+from gensim_dtm.topic_builder import build_model
+
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 8
+# Seconds a finished job stays available to the pollers.
+JOB_TTL = 600
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class _Progress(object):
+
+    def __init__(self, job_id, states):
+        self.job_id = job_id
+        self.states = states
+
+    def __call__(self, fraction, message=None, partial=None):
+        self.states[self.job_id] = {'state': 'running', 'progress': fraction,
+                                    'message': message, 'partial': partial}
+
+
+def _run(job_id, states, func, args):
+    progress = _Progress(job_id, states)
+    progress(0.0)
+    return func(progress, *args)
+
+
+def job_id(func, args):
+    return hashlib.sha1(repr((func.__module__, func.__name__, args)).encode('utf-8')).hexdigest()
+
+
+class JobManager(object):
+    """Runs jobs on `max_workers` worker processes."""
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, ttl=JOB_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._manager = multiprocessing.Manager()
+        # Progress reported by the workers, keyed by job id.
+        self._states = self._manager.dict()
+        # Workers must not reuse the database connections of the parent.
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=dispose_engine)
+        self._futures = {}
+        self._finished = {}
+        # Reentrant: the done callback runs in submit if the job is already done.
+        self._lock = threading.RLock()
+
+    def _purge(self):
+        now = time.monotonic()
+        for key, (finished, _) in list(self._finished.items()):
+            if finished + self.ttl < now:
+                del self._finished[key]
+                self._futures.pop(key, None)
+                self._states.pop(key, None)
+
+    def submit(self, func, *args):
+        """Submits `func(progress, *args)` and returns the id of its job.
+        Raises JobQueueFull if too many jobs are waiting or running."""
+        key = job_id(func, args)
+        with self._lock:
+            self._purge()
+            future = self._futures.get(key)
+            if future is not None and not future.done():
+                return key
+            if sum(not future.done() for future in self._futures.values()) >= self.max_pending:
+                raise JobQueueFull("{} jobs are already waiting or running".format(self.max_pending))
+            self._finished.pop(key, None)
+            self._states[key] = {'state': 'pending', 'progress': 0.0, 'message': None, 'partial': None}
+            future = self._executor.submit(_run, key, self._states, func, args)
+            self._futures[key] = future
+            future.add_done_callback(lambda future: self._done(key, future))
+        return key
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is not future:
+                return
+            error = future.exception()
+            if error is None:
+                status = {'state': 'done', 'progress': 1.0, 'result': future.result()}
+            else:
+                status = {'state': 'failed', 'error': ''.join(traceback.format_exception_only(type(error), error))}
+            self._finished[key] = (time.monotonic(), status)
+
+    def status(self, key):
+        """Returns the state of the job `key` ('pending', 'running', 'done',
+        'failed' or 'unknown') with its 'progress', 'message' and 'partial'
+        results, its 'result' once done or its 'error' if it failed."""
+        with self._lock:
+            if key in self._finished:
+                return dict(self._finished[key][1])
+        state = self._states.get(key)
+        if state is None:
+            return {'state': 'unknown'}
+        return dict(state)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self._manager.shutdown()
+
+
+def retrain_city_model(progress, city):
+    """Job retraining the topic model of `city`. Returns its meta data."""
+    connection = get_engine().connect()
+    try:
+        return build_model(connection, 'city', city, force=True, progress=progress)
+    finally:
+        connection.close()
+
+
+def count_articles(progress, start, end):
+    """Job counting the articles of every city published in [`start`, `end`).
+    The counts so far are reported as partial results."""
+    connection = get_engine().connect()
+    try:
+        total = connection.execute(sqlalchemy.select([sqlalchemy.func.count()]).where(
+            collection.c.publication_date >= start).where(collection.c.publication_date < end)).scalar()
+        counts = {}
+        done = 0
+        for chunk in read_articles(connection, columns=['city'], start=start, end=end):
+            for city, count in chunk['city'].value_counts().items():
+                if count:
+                    counts[city] = counts.get(city, 0) + int(count)
+            done += len(chunk)
+            progress(done / max(total, 1), '{} of {} articles'.format(done, total), dict(counts))
+        return counts
+    finally:
+        connection.close()
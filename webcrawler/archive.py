@@ -0,0 +1,114 @@
+"""Columnar archive of the crawled articles.
+Articles of the sources stored as 'archive' are appended to a Parquet dataset
+under `ARCHIVE`, partitioned by country, source and crawl date:
+
+    ARTICLES/ARCHIVE/country=AFG/source=afghanistan_times/date=2021-03-01/part-<id>.parquet
+
+Every crawl writes a new file, one row group per batch, and files are only
+made visible once complete, so nothing is ever rewritten. Readers select the
+columns they need and prune the partitions with their filters, so analysing
+months of articles reads a few columns of the matching files only.
+"""
+import os
+import uuid
+from datetime import date
+
+import pyarrow
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from webcrawler.pipeline import batched
+
+ARTICLES = 'ARTICLES'
+ARCHIVE = os.path.join(ARTICLES, 'ARCHIVE')
+COMPRESSION = 'zstd'
+# Articles per row group.
+BATCH_SIZE = 1000
+
+SCHEMA = pyarrow.schema([
+    ('title', pyarrow.string()),
+    ('article_text', pyarrow.string()),
+    ('url', pyarrow.string()),
+    ('newspaper', pyarrow.string()),
+    ('city', pyarrow.string()),
+    ('publication_date', pyarrow.date32()),
+])
+
+PARTITIONING = ds.partitioning(pyarrow.schema([
+    ('country', pyarrow.string()),
+    ('source', pyarrow.string()),
+    ('date', pyarrow.date32()),
+]), flavor='hive')
+
+
+def partition_dir(country, source, crawl_date, archive_dir=ARCHIVE):
+    return os.path.join(archive_dir, 'country=' + country, 'source=' + source,
+                        'date=' + crawl_date.isoformat())
+
+
+def append_articles(records, country, source, crawl_date=None, archive_dir=ARCHIVE, batch_size=BATCH_SIZE):
+    """Appends `records` (articles as returned by the parsers) to the
+    partition of `country`, `source` and `crawl_date` (default: today) in a
+    new file, written in batches. Returns the number of articles written."""
+    directory = partition_dir(country, source, crawl_date or date.today(), archive_dir)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'part-{}.parquet'.format(uuid.uuid4().hex))
+    tmp_path = os.path.join(directory, '.' + os.path.basename(path) + '.tmp')
+    count = 0
+    writer = pq.ParquetWriter(tmp_path, SCHEMA, compression=COMPRESSION)
+    try:
+        for batch in batched(records, batch_size):
+            writer.write_table(pyarrow.Table.from_pylist(
+                [{name: record.get(name) for name in SCHEMA.names} for record in batch], schema=SCHEMA))
+            count += len(batch)
+    finally:
+        writer.close()
+        # Keep what was crawled before a failure, but never publish an empty file.
+        if count:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    return count
+
+
+def dataset(archive_dir=ARCHIVE):
+    # Files starting with '.' or '_' (files being written) are ignored.
+    return ds.dataset(archive_dir, format='parquet', partitioning=PARTITIONING)
+
+
+def _filter(countries, sources, start, end):
+    conditions = []
+    if countries is not None:
+        conditions.append(ds.field('country').isin(list(countries)))
+    if sources is not None:
+        conditions.append(ds.field('source').isin(list(sources)))
+    if start is not None:
+        conditions.append(ds.field('date') >= start)
+    if end is not None:
+        conditions.append(ds.field('date') < end)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_archive(columns=None, countries=None, sources=None, start=None, end=None, archive_dir=ARCHIVE):
+    """Returns a dataframe with the `columns` (default: all, including the
+    country, source and date partitions) of the articles crawled in
+    [`start`, `end`) from `countries` and `sources` (default: any)."""
+    if not os.path.isdir(archive_dir):
+        return pyarrow.table({name: [] for name in columns or SCHEMA.names}).to_pandas()
+    return dataset(archive_dir).to_table(columns=columns,
+                                         filter=_filter(countries, sources, start, end)).to_pandas()
+
+
+def iter_archive(columns=None, countries=None, sources=None, start=None, end=None, archive_dir=ARCHIVE,
+                 batch_size=BATCH_SIZE):
+    """Yields the articles of `read_archive` in dataframes of at most
+    `batch_size` rows."""
+    if not os.path.isdir(archive_dir):
+        return
+    for batch in dataset(archive_dir).to_batches(columns=columns, filter=_filter(countries, sources, start, end),
+                                                 batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
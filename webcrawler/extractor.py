@@ -0,0 +1,225 @@
+"""Extraction engine shared by every source of `webcrawler.sources`.
+A `SourceExtractor` compiles the selectors of one source once, and runs the
+listing pages, the article pages and the storage of the articles through the
+shared fetch engine, HTTP cache and streaming pipeline.
+"""
+import hashlib
+import json
+import re
+import threading
+from contextlib import closing
+from datetime import date
+from urllib.parse import urljoin
+
+from text_processing.text_processing_utils import convert_to_raw_text_batch
+from database.news_queries import bump_data_versions, create_rollup_table, refresh_city_counts
+from database.sqlalchemy_utils import *
+from database.token_store import create_token_table, store_tokens
+from webcrawler.archive import append_articles
+from webcrawler.fetch import Fetcher
+from webcrawler.html_parsing import class_strainer, make_soup
+from webcrawler.http_cache import http_cache
+from webcrawler.pipeline import Pipeline, batched
+from webcrawler.seen_urls import SeenUrls
+from webcrawler.sources import SOURCES
+
+today = date.today()
+# Batches cleaned at once; the batch API already spreads each of them over
+# one process per core.
+CLEAN_WORKERS = 2
+# Bump whenever the parsing code changes, so that the parse results cached
+# for unchanged pages are discarded.
+PARSER_VERSION = 1
+
+months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November',
+          'December']
+
+
+class CrawlStats(object):
+    """Thread-safe counters of a crawl."""
+
+    def __init__(self):
+        self.counts = {'pages': 0, 'failed_pages': 0, 'articles': 0, 'dropped_articles': 0}
+        self._lock = threading.Lock()
+
+    def add(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+
+class SourceExtractor(object):
+
+    def __init__(self, source, fetcher=None, name=None):
+        self.source = source
+        self.name = name if name is not None else source['newspaper']
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=http_cache)
+        config = json.dumps([PARSER_VERSION, source], sort_keys=True)
+        self.parse_key = hashlib.sha1(config.encode('utf-8')).hexdigest()
+        self.listing = [(class_strainer(*level['region']), level['links']) for level in source['listing']]
+        article = source['article']
+        self.article_id = re.compile(article['id']) if 'id' in article else None
+        self.article_strainer = class_strainer(*article['region'])
+        self.title_selector = article['title']
+        self.body_selector = article['body']
+        self.dateline = re.compile(article['dateline']) if 'dateline' in article else None
+        self.dateline_prefix = re.compile(article['dateline'] + ' -') if 'dateline' in article else None
+
+    @classmethod
+    def from_registry(cls, name, fetcher=None):
+        return cls(SOURCES[name], fetcher, name)
+
+    def _extract(self, page, parse, kind):
+        """Returns `parse(page.body)`, through the cache of the fetcher if it
+        has one. The cached result is keyed on the source configuration and
+        on `kind`, the name of the parse."""
+        if self.fetcher.cache is None:
+            return parse(page.body)
+        return self.fetcher.cache.extract(page, parse, '{}:{}'.format(self.parse_key, kind))
+
+    def parse_links(self, level, url, body):
+        """Returns the absolute urls linked from a listing page."""
+        strainer, selector = self.listing[level]
+        soup = make_soup(body, parse_only=strainer)
+        links = []
+        for element in soup.select(selector):
+            a = element.find("a")
+            if a is not None and a.get('href'):
+                links.append(urljoin(url, a['href']))
+        return links
+
+    def scrape_links(self, level, urls):
+        """Fetches the listing pages `urls` of a level and returns the urls
+        they link to."""
+        links = []
+        for page in self.fetcher.fetch_all(urls):
+            if page is None:
+                continue
+            links.extend(self._extract(page, lambda body: self.parse_links(level, page.url, body),
+                                       'links-{}'.format(level)))
+        return links
+
+    def scrape_article_urls(self):
+        """Follows the listing pages from the front page and returns the
+        article urls."""
+        urls = [self.source['start_url']]
+        for level in range(len(self.listing)):
+            urls = self.scrape_links(level, urls)
+        return urls
+
+    def parse_article(self, url, body):
+        """Returns the article record of a page, or None if the page has no
+        dateline although the source requires one."""
+        article_id = self.article_id.search(url).group('id') if self.article_id is not None else None
+        soup = make_soup(body, parse_only=self.article_strainer)
+        title = soup.select_one(self.title_selector.format(id=article_id)).get_text()
+        article = soup.select_one(self.body_selector.format(id=article_id))
+        match = None
+        paragraphs = []
+        for p in article.find_all('p'):
+            paragraph = p.get_text()
+            if self.source['strip_newlines']:
+                paragraph = paragraph.replace('\n', '')
+            if self.dateline is not None and not paragraphs:
+                match = self.dateline.match(paragraph)
+                paragraph = self.dateline_prefix.sub('', paragraph)
+            paragraphs.append(paragraph)
+        separator = self.source['paragraph_separator']
+        text = {'title': title,
+                'article_text': ''.join(paragraph + separator for paragraph in paragraphs),
+                'url': url,
+                'country': self.source['country'],
+                'newspaper': self.source['newspaper'],
+                'publication_date': None,
+                'city': None}
+        if self.dateline is not None:
+            if match is None:
+                return None
+            text['publication_date'] = date(year=int(match.group('year')),
+                                            month=months.index(match.group('month')) + 1,
+                                            day=int(match.group('day')))
+            text['city'] = match.group('city')
+        return text
+
+    def extract_article(self, page):
+        return self._extract(page, lambda body: self.parse_article(page.url, body), 'article')
+
+    def clean_batch(self, texts):
+        """Cleans the articles of a batch with a single call of the batch
+        API. Articles that go to the database also get the 'title_tokens'
+        and 'text_tokens' stored by `store_tokens`, computed in the same
+        call."""
+        if not self.source['clean'] and self.source['storage'] != 'database':
+            return texts
+        cleaned = convert_to_raw_text_batch([text['title'] for text in texts] +
+                                            [text['article_text'] for text in texts])
+        for i, text in enumerate(texts):
+            title, article_text = cleaned[i], cleaned[len(texts) + i]
+            if self.source['storage'] == 'database':
+                text['title_tokens'], text['text_tokens'] = title, article_text
+            if self.source['clean']:
+                text['title'], text['article_text'] = title, article_text
+        return texts
+
+    def iter_batches(self, url_list, seen_urls=None, stats=None):
+        """Yields the articles of `url_list` in batches as they are fetched,
+        parsed and cleaned by a streaming pipeline."""
+        if seen_urls is not None:
+            url_list = seen_urls.filter_new(url_list)
+        stats = stats if stats is not None else CrawlStats()
+
+        def fetch(url):
+            page = self.fetcher.fetch(url)
+            stats.add('pages' if page is not None else 'failed_pages')
+            return page
+
+        def extract(page):
+            text = self.extract_article(page)
+            stats.add('articles' if text is not None else 'dropped_articles')
+            return text
+
+        pipeline = Pipeline([
+            (fetch, self.fetcher.max_workers),
+            (extract, 2)])
+        return Pipeline([(self.clean_batch, CLEAN_WORKERS)], queue_size=CLEAN_WORKERS).run(
+            batched(pipeline.run(url_list)))
+
+    def iter_articles(self, url_list, seen_urls=None, stats=None):
+        """Yields the articles of `url_list` one by one, see
+        `iter_batches`."""
+        for batch in self.iter_batches(url_list, seen_urls, stats):
+            yield from batch
+
+    def crawl(self, builder=None):
+        """Crawls the source, stores its new articles and returns the
+        `CrawlStats` of the crawl. The cities and the country of the stored
+        articles are submitted to the `TopicBuilder` `builder`, if given."""
+        stats = CrawlStats()
+        url_list = self.scrape_article_urls()
+        if self.source['storage'] == 'database':
+            engine = create_table()
+            create_token_table(engine)
+            create_rollup_table(engine)
+            stored_cities = set()
+            with engine.connect() as connection:
+                seen_urls = SeenUrls.from_collection(connection)
+                # Closed on errors too, which stops the pipeline workers.
+                with closing(self.iter_batches(url_list, seen_urls, stats)) as batches:
+                    for texts in batches:
+                        ids = insert_data(texts, connection)
+                        store_tokens(texts, ids, connection)
+                        cities = {text['city'] for text in texts}
+                        refresh_city_counts(connection, cities)
+                        bump_data_versions(connection, cities)
+                        stored_cities |= cities
+            if builder is not None and stored_cities:
+                for city in stored_cities:
+                    builder.submit('city', city)
+                builder.submit('country', self.source['country'])
+        else:
+            with closing(self.iter_articles(url_list, stats=stats)) as articles:
+                append_articles(articles, self.source['country'], self.name, today)
+        return stats
+
+
+def crawl(name, fetcher=None, builder=None):
+    return SourceExtractor.from_registry(name, fetcher).crawl(builder)
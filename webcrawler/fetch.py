@@ -0,0 +1,150 @@
+"""Shared fetch engine for the country parsers.
+Pages are downloaded on a bounded thread pool, with a cap on the number of
+simultaneous requests per host, a socket timeout and retries with exponential
+backoff. Results are always returned in the order of the input urls.
+A single `Fetcher` can be shared by several crawls: it bounds the total number
+of requests in flight, spaces out the requests to every host and stops
+fetching after a deadline. When an `HttpCache` is given, requests are made conditional on the cached
+validators and 304 responses are served from the cache.
+"""
+import http.client
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen as uReq
+
+MAX_WORKERS = 16
+MAX_PER_HOST = 4
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+MIN_INTERVAL = 0
+
+Page = namedtuple('Page', ['url', 'body', 'not_modified'])
+
+
+class Fetcher(object):
+    """Downloads pages concurrently.
+    Parameters
+    ----------
+    max_workers : int
+        Size of the thread pool, and total number of requests in flight
+        across every thread using this fetcher.
+    max_per_host : int
+        Maximum number of simultaneous requests to a single host.
+    min_interval : float
+        Minimum delay in seconds between the start of two requests to the
+        same host.
+    timeout : float
+        Socket timeout in seconds for every request.
+    retries : int
+        Number of retries after the first attempt. Only connection, SSL and
+        protocol errors, timeouts and 429/5xx responses are retried.
+    backoff : float
+        Base delay in seconds, doubled after every failed attempt.
+    cache : HttpCache, optional
+        Cache used for conditional requests.
+    deadline : float, optional
+        `time.monotonic()` value after which no request is started any more.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                 timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, cache=None,
+                 min_interval=MIN_INTERVAL, deadline=None):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.min_interval = min_interval
+        self.deadline = deadline
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._host_slots = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _wait_turn(self, url):
+        """Waits until the next request to the host of `url` may start."""
+        if not self.min_interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        time.sleep(start - now)
+
+    def _remaining(self):
+        if self.deadline is None:
+            return self.timeout
+        return min(self.timeout, self.deadline - time.monotonic())
+
+    def _open(self, url):
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        with self._host_slot(url):
+            self._wait_turn(url)
+            with self._slots:
+                timeout = self._remaining()
+                if timeout <= 0:
+                    raise socket.timeout('crawl deadline reached')
+                try:
+                    req = uReq(Request(url, headers=headers), timeout=timeout)
+                except HTTPError as e:
+                    if e.code == 304 and headers:
+                        body = self.cache.load(url)
+                        if body is not None:
+                            return Page(url, body, True)
+                    raise
+                try:
+                    body = req.read()
+                finally:
+                    req.close()
+        if self.cache is not None:
+            self.cache.store(url, body, req.headers)
+        return Page(url, body, False)
+
+    def fetch(self, url):
+        """Returns the `Page` for `url`, or None if it could not be
+        downloaded."""
+        for attempt in range(self.retries + 1):
+            try:
+                return self._open(url)
+            except HTTPError as e:
+                if e.code != 429 and e.code < 500 or attempt == self.retries:
+                    print('Error: ', e.code, url)
+                    return None
+            except (http.client.HTTPException, OSError) as e:
+                # OSError covers URLError, timeouts, resets and SSL errors;
+                # HTTPException covers truncated or malformed responses.
+                if attempt == self.retries or self._remaining() <= 0:
+                    print('Error: ', e, url)
+                    return None
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch_all(self, url_list):
+        """Downloads every url of `url_list` and returns the pages in the
+        same order. Failed downloads are returned as None."""
+        if not url_list:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(url_list))) as executor:
+            return list(executor.map(self.fetch, url_list))
+
+
+def fetch(url, **kwargs):
+    return Fetcher(**kwargs).fetch(url)
+
+
+def fetch_all(url_list, **kwargs):
+    return Fetcher(**kwargs).fetch_all(url_list)
@@ -0,0 +1,30 @@
+"""HTML parser backend for the crawler.
+BeautifulSoup is used with the fastest tree builder that is installed: lxml
+if available, otherwise the pure Python html.parser. The parsers pass a
+`SoupStrainer` so that only the regions they read are turned into a tree.
+"""
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+BACKENDS = ['lxml', 'html.parser']
+AVAILABLE_BACKENDS = [backend for backend in BACKENDS if backend != 'lxml' or lxml is not None]
+PARSER = AVAILABLE_BACKENDS[0]
+
+
+def make_soup(body, parse_only=None, parser=None):
+    """Parses `body` with `parser` (default: the fastest available backend),
+    keeping only the elements matched by the `parse_only` strainer."""
+    return BeautifulSoup(body, parser or PARSER, parse_only=parse_only)
+
+
+def class_strainer(*classes, name=None):
+    """Returns a strainer keeping the `name` elements that carry any of
+    `classes`. The class attribute is matched as a whole string while
+    parsing, so a regular expression is used to match single classes."""
+    pattern = re.compile(r'(^|\s)(' + '|'.join(re.escape(c) for c in classes) + r')(\s|$)')
+    return SoupStrainer(name, class_=pattern)
@@ -0,0 +1,94 @@
+"""On-disk HTTP cache for the crawler.
+Every page is stored under ARTICLES/HTTP_CACHE, keyed by a hash of its url,
+together with the ETag and Last-Modified headers of the response. Those are
+sent back as conditional request headers on the next crawl, and a
+304 Not Modified response is answered from disk. The values extracted from a
+page by the parsers are cached alongside it, under the key of the parse that
+produced them, so an unchanged page is not parsed again either.
+"""
+import glob
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+
+ARTICLES = 'ARTICLES'
+HTTP_CACHE = 'HTTP_CACHE'
+
+
+class HttpCache(object):
+
+    def __init__(self, cache_dir=os.path.join(ARTICLES, HTTP_CACHE)):
+        self.cache_dir = cache_dir
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def _meta(self, url):
+        try:
+            with open(self._path(url, '.json'), 'r') as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return {}
+
+    def conditional_headers(self, url):
+        """Returns the If-None-Match / If-Modified-Since headers for `url`,
+        or an empty dict if the page is not cached."""
+        meta = self._meta(url)
+        if not os.path.exists(self._path(url, '.html')):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url):
+        """Returns the cached body of `url`, or None."""
+        try:
+            with open(self._path(url, '.html'), 'rb') as infile:
+                return infile.read()
+        except OSError:
+            return None
+
+    def store(self, url, body, headers):
+        """Stores a freshly downloaded body with its validators. Any values
+        previously extracted from the page are discarded."""
+        path = self._path(url, '.html')
+        pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as outfile:
+            outfile.write(body)
+        with open(self._path(url, '.json'), 'w') as outfile:
+            json.dump({'url': url,
+                       'etag': headers.get('ETag'),
+                       'last_modified': headers.get('Last-Modified')}, outfile)
+        for path in glob.glob(self._path(url, '.*.pickle')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def extract(self, page, parse, key=''):
+        """Returns `parse(page.body)`. If the page was answered with
+        304 Not Modified and has been parsed before with the same `key`, which
+        identifies the parse function and its configuration, the stored result
+        is returned without parsing it again."""
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        path = self._path(page.url, '.{}.pickle'.format(key[:16]))
+        if page.not_modified:
+            try:
+                with open(path, 'rb') as infile:
+                    return pickle.load(infile)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+        result = parse(page.body)
+        pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as outfile:
+            pickle.dump(result, outfile)
+        return result
+
+
+http_cache = HttpCache()
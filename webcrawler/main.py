@@ -1,49 +1,30 @@
-import ldanalysis
-import webcrawler.sudan_parser
-import webcrawler.afghanistan_parser
-import json
-from datetime import date
-import os
-
-
-today = date.today()
-dstr = today.strftime("%Y%m%d")
-ARTICLES = 'ARTICLES'
-SUDAN = 'SUDAN'
-SDT = 'SDT'
-SUNA = 'SUNA'
-AFGHANISTAN = 'AFGHANISTAN'
-AT = 'AT'
-
-
-def sudan_main():
-    sudan_parser.main()
-    with open(os.path.join(ARTICLES, SUDAN, SDT, 'sdt_latest_news_' + dstr + '.json'), 'r') as infile:
-        body = json.load(infile)
-    content = [d['text'] for d in body]
-    titles = [d['title'] for d in body]
-    with open(os.path.join(ARTICLES, SUDAN, SUNA, 'suna_latest_news_' + dstr + '.json'), 'r') as infile:
-        body = json.load(infile)
-    content.extend([d['text'] for d in body])
-    titles.extend([d['title'] for d in body])
-    # text preprocessing: tokenization
-    vocab, X = ldanalysis.tokenize(content)
-    ldanalysis.ldanalysis(X, vocab, titles, SUDAN)
-
-
-def afghanistan_main():
-    print('here0')
-    webcrawler.afghanistan_parser.main()
-    print('here1')
-    with open(os.path.join(ARTICLES, AFGHANISTAN, AT, 'at_latest_news_' + dstr + '.json'), 'r') as infile:
-        body = json.load(infile)
-    content = [d['text'] for d in body]
-    titles = [d['title'] for d in body]
+from webcrawler import ldanalysis
+from webcrawler.archive import read_archive
+from webcrawler.extractor import SourceExtractor
+from webcrawler.scheduler import crawl_all, print_stats
+from webcrawler.sources import SOURCES
+from datetime import date, timedelta
+
+
+def analyse_source(name, start=None, end=None):
+    """Runs the LDA analysis on the archived articles of the source `name`
+    crawled in [`start`, `end`) (default: today)."""
+    start = start or date.today()
+    end = end or start + timedelta(days=1)
+    extractor = SourceExtractor.from_registry(name)
+    body = read_archive(columns=['title', 'article_text'], sources=[name], start=start, end=end)
+    if body.empty:
+        return
+    content = list(body['article_text'])
+    titles = list(body['title'])
     # text preprocessing: tokenization
     vocab, X = ldanalysis.tokenize(content)
-    ldanalysis.ldanalysis(X, vocab, titles, AFGHANISTAN)
+    ldanalysis.ldanalysis(X, vocab, titles, extractor.source['directory'][0])
 
 
 if __name__ == "__main__":
-    print('here1')
-    afghanistan_main()
+    stats = crawl_all()
+    print_stats(stats)
+    for row in stats:
+        if row['error'] is None and SOURCES[row['source']]['storage'] == 'archive':
+            analyse_source(row['source'])
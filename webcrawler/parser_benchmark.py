@@ -0,0 +1,71 @@
+"""Benchmark of the HTML parser backends over saved pages.
+By default the pages stored by the HTTP cache are used as fixtures. Every
+page is parsed into a full tree and with the article strainer of its source,
+with every available backend, and its paragraphs are collected.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+from webcrawler.extractor import SourceExtractor
+from webcrawler.html_parsing import AVAILABLE_BACKENDS, make_soup
+from webcrawler.http_cache import ARTICLES, HTTP_CACHE
+from webcrawler.sources import SOURCES
+
+STRAINERS = {
+    urlsplit(source['start_url']).netloc: SourceExtractor(source).article_strainer
+    for source in SOURCES.values()
+}
+
+
+def load_fixtures(fixture_dir):
+    """Returns (host, body) pairs for every cached page of a known source."""
+    fixtures = []
+    for meta_path in glob.glob(os.path.join(fixture_dir, '**', '*.json'), recursive=True):
+        with open(meta_path, 'r') as infile:
+            host = urlsplit(json.load(infile)['url']).netloc
+        body_path = meta_path[:-len('.json')] + '.html'
+        if host in STRAINERS and os.path.exists(body_path):
+            with open(body_path, 'rb') as infile:
+                fixtures.append((host, infile.read()))
+    return fixtures
+
+
+def benchmark(fixtures, parser, strained, repeat=3):
+    """Returns the number of pages parsed per second."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for host, body in fixtures:
+            soup = make_soup(body, parse_only=STRAINERS[host] if strained else None, parser=parser)
+            soup.find_all('p')
+    return repeat * len(fixtures) / (time.perf_counter() - start)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-f', '--fixtures',
+        help='Directory of cached pages to parse.',
+        type=str,
+        default=os.path.join(ARTICLES, HTTP_CACHE))
+    parser.add_argument(
+        '-r', '--repeat',
+        help='Number of passes over the fixtures.',
+        type=int,
+        default=3)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    fixtures = load_fixtures(args.fixtures)
+    print('{} pages'.format(len(fixtures)))
+    if fixtures:
+        for backend in AVAILABLE_BACKENDS:
+            for strained in (False, True):
+                print('{:<12} {:<9} {:8.1f} pages/s'.format(
+                    backend, 'strained' if strained else 'full',
+                    benchmark(fixtures, backend, strained, args.repeat)))
@@ -0,0 +1,128 @@
+"""Streaming pipeline from crawl to storage.
+Every stage runs on its own worker threads and the stages are connected by
+bounded queues, so a slow stage applies back pressure to the ones before it
+and memory use does not depend on the number of articles. Results are handed
+to storage in batches as soon as they are available. When the consumer stops
+early, the workers stop too instead of blocking on a full queue.
+"""
+import threading
+from queue import Empty, Full, Queue
+
+QUEUE_SIZE = 64
+BATCH_SIZE = 50
+# Seconds between two checks of the stop event by a blocked thread.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+def _put(queue, item, stop):
+    """Puts `item` on `queue`, unless `stop` is set first. Returns whether
+    it was put."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=POLL_INTERVAL)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _get(queue, stop):
+    """Returns the next item of `queue`, or `_DONE` if `stop` is set
+    first."""
+    while not stop.is_set():
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            pass
+    return _DONE
+
+
+class Pipeline(object):
+    """A chain of stages.
+    Parameters
+    ----------
+    stages : list of (callable, int)
+        Each stage is a function applied to every item coming out of the
+        previous stage, and the number of threads running it. Items for which
+        a stage returns None or raises are dropped.
+    queue_size : int
+        Maximum number of items waiting between two stages.
+    """
+
+    def __init__(self, stages, queue_size=QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    @staticmethod
+    def _feed(items, outbox, stop):
+        items = iter(items)
+        try:
+            for item in items:
+                if not _put(outbox, item, stop):
+                    break
+        finally:
+            # Stops the pipeline `items` may come from.
+            if hasattr(items, 'close'):
+                items.close()
+            _put(outbox, _DONE, stop)
+
+    @staticmethod
+    def _work(func, inbox, outbox, stop):
+        while True:
+            item = _get(inbox, stop)
+            if item is _DONE:
+                _put(inbox, _DONE, stop)
+                return
+            try:
+                result = func(item)
+            except Exception as e:
+                print("Error: ", e)
+                continue
+            if result is not None and not _put(outbox, result, stop):
+                return
+
+    @staticmethod
+    def _close(workers, outbox, stop):
+        for worker in workers:
+            worker.join()
+        _put(outbox, _DONE, stop)
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, items):
+        """Yields the output of the last stage for every item of `items`, in
+        completion order. Closing the generator stops the workers."""
+        stop = threading.Event()
+        inbox = Queue(self.queue_size)
+        self._start(self._feed, items, inbox, stop)
+        for func, num_workers in self.stages:
+            outbox = Queue(self.queue_size)
+            workers = [self._start(self._work, func, inbox, outbox, stop) for _ in range(num_workers)]
+            self._start(self._close, workers, outbox, stop)
+            inbox = outbox
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            stop.set()
+
+
+def batched(items, batch_size=BATCH_SIZE):
+    """Groups `items` into lists of at most `batch_size` elements."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
@@ -0,0 +1,93 @@
+"""Crawls every registered source in parallel.
+All sources share one `Fetcher`, which bounds the number of requests in
+flight, spaces out the requests to each domain and stops fetching at the
+crawl deadline, so the crawl takes as long as the slowest source. The topic models of the cities
+and countries that got new articles are rebuilt before the crawl returns.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gensim_dtm.topic_builder import TopicBuilder
+from webcrawler.extractor import SourceExtractor
+from webcrawler.fetch import Fetcher
+from webcrawler.http_cache import http_cache
+from webcrawler.sources import SOURCES
+
+MAX_WORKERS = 16
+MIN_INTERVAL = 0.5
+DEADLINE = 30 * 60
+
+
+def _crawl_source(name, fetcher, builder):
+    start = time.monotonic()
+    result = {'source': name}
+    try:
+        result.update(SourceExtractor.from_registry(name, fetcher).crawl(builder).counts)
+        result['error'] = None
+    except Exception as e:
+        result['error'] = repr(e)
+    result['seconds'] = round(time.monotonic() - start, 1)
+    return result
+
+
+def crawl_all(names=None, max_workers=MAX_WORKERS, min_interval=MIN_INTERVAL, deadline=DEADLINE):
+    """Crawls the sources `names` (default: all registered sources) and
+    returns a list of per-source statistics.
+    Parameters
+    ----------
+    names : list of str, optional
+    max_workers : int
+        Total number of requests in flight across all sources.
+    min_interval : float
+        Minimum delay in seconds between two requests to the same domain.
+    deadline : float
+        Time budget of the crawl in seconds. No request is started after it.
+    """
+    names = list(SOURCES) if names is None else names
+    fetcher = Fetcher(max_workers=max_workers, min_interval=min_interval,
+                      deadline=time.monotonic() + deadline, cache=http_cache)
+    builder = TopicBuilder()
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        stats = list(executor.map(lambda name: _crawl_source(name, fetcher, builder), names))
+    builder.join()
+    return stats
+
+
+def print_stats(stats):
+    for row in stats:
+        if row['error'] is not None:
+            print('{source}: failed after {seconds}s: {error}'.format(**row))
+        else:
+            print('{source}: {articles} articles, {dropped_articles} dropped, {pages} pages, '
+                  '{failed_pages} failed pages in {seconds}s'.format(**row))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-s', '--sources',
+        help='Sources to crawl (default: all registered sources).',
+        nargs='*',
+        choices=sorted(SOURCES))
+    parser.add_argument(
+        '-w', '--max-workers',
+        help='Total number of requests in flight.',
+        type=int,
+        default=MAX_WORKERS)
+    parser.add_argument(
+        '-i', '--min-interval',
+        help='Minimum delay in seconds between two requests to a domain.',
+        type=float,
+        default=MIN_INTERVAL)
+    parser.add_argument(
+        '-d', '--deadline',
+        help='Time budget of the crawl in seconds.',
+        type=float,
+        default=DEADLINE)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    print_stats(crawl_all(args.sources or None, args.max_workers, args.min_interval, args.deadline))
@@ -0,0 +1,60 @@
+"""Index of article urls that are already stored, so that the parsers only
+fetch new articles. The stored articles are looked up by the sha1 of their
+url on the unique `url_hash` index, only for the candidate urls of a crawl,
+so the cost of a lookup does not grow with the archive."""
+import sqlalchemy
+from database.schema import url_hash
+
+# Hashes per query, below the bound parameter limits of the databases.
+LOOKUP_BATCH_SIZE = 500
+
+query_stored_hashes = sqlalchemy.text(
+    "SELECT url_hash FROM collection WHERE url_hash IN :hashes"
+).bindparams(sqlalchemy.bindparam('hashes', expanding=True))
+
+
+class SeenUrls(object):
+
+    def __init__(self, urls=(), connection=None):
+        self._urls = set(urls)
+        self.connection = connection
+
+    @classmethod
+    def from_collection(cls, connection):
+        """Returns an index of the urls stored in the `collection` table,
+        queried on demand through `connection`."""
+        return cls(connection=connection)
+
+    def _stored(self, urls):
+        """Returns the urls of `urls` that are stored in the collection."""
+        if self.connection is None or not urls:
+            return set()
+        hashes = {url_hash(url): url for url in urls}
+        keys = list(hashes)
+        stored = set()
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            result = self.connection.execute(query_stored_hashes, hashes=keys[start:start + LOOKUP_BATCH_SIZE])
+            stored.update(hashes[row[0]] for row in result)
+        return stored
+
+    def __contains__(self, url):
+        return url in self._urls or bool(self._stored([url]))
+
+    def __len__(self):
+        """Number of urls seen during this crawl."""
+        return len(self._urls)
+
+    def add(self, url):
+        self._urls.add(url)
+
+    def filter_new(self, url_list):
+        """Returns the urls of `url_list` that have not been seen or stored,
+        without duplicates and in their original order. The returned urls
+        are marked as seen."""
+        candidates = []
+        for url in url_list:
+            if url not in self._urls:
+                self._urls.add(url)
+                candidates.append(url)
+        stored = self._stored(candidates)
+        return [url for url in candidates if url not in stored]
@@ -0,0 +1,95 @@
+"""Registry of the crawled newspapers.
+Each source is described by its selectors only; `webcrawler.extractor` runs
+the same engine for all of them.
+
+Keys of a source
+----------------
+country, newspaper : str
+    Metadata stored with every article.
+directory : tuple of str
+    Sub directories of ARTICLES used for the files of the source.
+start_url : str
+    Front page of the crawl.
+listing : list of dict
+    Pages followed from the front page to the articles. At every level,
+    `links` is a CSS selector of the elements whose first <a> points to the
+    pages of the next level, and `region` the classes of the elements that
+    need to be parsed to find them.
+article : dict
+    `title` and `body` are CSS selectors of the title and of the element
+    holding the <p> paragraphs. They may refer to `{id}`, the article number
+    captured by the `id` regex from the url. `region` lists the classes that
+    need to be parsed. `dateline` is an optional regex matched on the first
+    paragraph, with `month`, `day`, `year` and `city` groups; articles
+    without a dateline are dropped when it is given.
+paragraph_separator : str
+    Separator used to join paragraphs.
+strip_newlines : bool
+    Remove newlines inside paragraphs.
+clean : bool
+    Lemmatize title and text with `convert_to_raw_text` before storing.
+storage : str
+    'database' to upsert into the collection table, 'archive' to append to
+    the Parquet archive of `webcrawler.archive`.
+"""
+
+SOURCES = {
+    'afghanistan_times': {
+        'country': 'AFG',
+        'newspaper': 'Afghanistan Times',
+        'directory': ('AFGHANISTAN', 'AT'),
+        'start_url': 'http://www.afghanistantimes.af/',
+        'listing': [
+            {'region': ['content'], 'links': 'div.content div.cat-box-title h2'},
+            {'region': ['content'], 'links': 'div.content article.item-list h2'},
+        ],
+        'article': {
+            'region': ['entry-title', 'entry'],
+            'title': 'h1.name.post-title.entry-title',
+            'body': 'div.entry',
+        },
+        'paragraph_separator': ' ',
+        'strip_newlines': False,
+        'clean': False,
+        'storage': 'archive',
+    },
+    'sudan_tribune': {
+        'country': 'SD',
+        'newspaper': 'Sudan Times',
+        'directory': ('SUDAN', 'SDT'),
+        'start_url': 'https://www.sudantribune.com/',
+        'listing': [
+            {'region': ['latest_news'], 'links': 'div.latest_news h1'},
+        ],
+        'article': {
+            'id': r'article(?P<id>[0-9]+)',
+            'region': ['crayon'],
+            'title': 'h1.crayon.article-titre-{id}',
+            'body': 'div.crayon.article-texte-{id}.texte.entry-content',
+            'dateline': r"(?P<month>[A-Za-z]+) (?P<day>[0-9]{1,2}),? (?P<year>[0-9]{4}) \((?P<city>[A-Z]+)\)",
+        },
+        'paragraph_separator': '\n',
+        'strip_newlines': True,
+        'clean': True,
+        'storage': 'database',
+    },
+    'hiiraan': {
+        'country': 'SO',
+        'newspaper': 'Hiiraan Online',
+        'directory': ('SOMALIA', 'HIIRAAN'),
+        'start_url': 'https://www.hiiraan.com/',
+        'listing': [
+            {'region': ['featured', 'featured-story2'], 'links': 'div.featured h1, div.featured-story2 h1'},
+        ],
+        'article': {
+            'id': r'article(?P<id>[0-9]+)',
+            'region': ['crayon'],
+            'title': 'h1.crayon.article-titre-{id}',
+            'body': 'div.crayon.article-texte-{id}.texte.entry-content',
+        },
+        'paragraph_separator': ' ',
+        'strip_newlines': False,
+        'clean': False,
+        'storage': 'archive',
+    },
+}
@@ -0,0 +1,87 @@
+"""Tests of the fetch engine and its HTTP cache against a local server."""
+import http.server
+import threading
+
+import pytest
+
+from webcrawler.fetch import Fetcher
+from webcrawler.http_cache import HttpCache
+
+ETAG = '"v1"'
+BODY = b'<html><body>front page</body></html>'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    Handler.requests = []
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/news'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_not_modified_is_served_from_the_cache(url, tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    first = Fetcher(cache=cache).fetch(url)
+    assert first.body == BODY and not first.not_modified
+    second = Fetcher(cache=cache).fetch(url)
+    assert second.body == BODY and second.not_modified
+    assert Handler.requests[1].get('If-None-Match') == ETAG
+
+
+def test_not_modified_page_is_not_parsed_again(url, tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    parsed = []
+
+    def parse(body):
+        parsed.append(body)
+        return len(body)
+
+    assert cache.extract(Fetcher(cache=cache).fetch(url), parse) == len(BODY)
+    assert cache.extract(Fetcher(cache=cache).fetch(url), parse) == len(BODY)
+    assert parsed == [BODY]
+
+
+def test_parse_results_are_keyed_on_the_parse(url, tmp_path):
+    cache = HttpCache(str(tmp_path / 'cache'))
+    parsed = []
+
+    def parse(body):
+        parsed.append(body)
+        return len(parsed)
+
+    assert cache.extract(Fetcher(cache=cache).fetch(url), parse, 'links-0') == 1
+    page = Fetcher(cache=cache).fetch(url)
+    assert page.not_modified
+    assert cache.extract(page, parse, 'links-1') == 2
+    assert cache.extract(page, parse, 'links-0') == 1
+    assert cache.extract(page, parse, 'links-1') == 2
+    cache.store(url, BODY, {})
+    assert cache.extract(page, parse, 'links-0') == 3
+
+
+def test_fetch_without_cache_is_unconditional(url):
+    fetcher = Fetcher(cache=None)
+    assert [page.not_modified for page in fetcher.fetch_all([url, url])] == [False, False]
+    assert all('If-None-Match' not in headers for headers in Handler.requests)
@@ -0,0 +1,27 @@
+"""Tests of the streaming pipeline."""
+import itertools
+import threading
+import time
+
+from webcrawler.pipeline import Pipeline, batched
+
+
+def wait_for_threads(count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return threading.active_count()
+
+
+def test_every_item_goes_through_the_stages():
+    pipeline = Pipeline([(lambda x: x * 2, 3), (lambda x: x + 1 if x % 4 else None, 2)], queue_size=2)
+    assert sorted(pipeline.run(range(10))) == [3, 7, 11, 15, 19]
+
+
+def test_closing_stops_the_workers():
+    count = threading.active_count()
+    inner = Pipeline([(lambda x: x, 2)], queue_size=1)
+    results = Pipeline([(len, 2)], queue_size=1).run(batched(inner.run(itertools.count()), 3))
+    assert next(results) == 3
+    results.close()
+    assert wait_for_threads(count) == count